@@ -1,20 +1,18 @@
+import time
+RERUN_T0 = time.perf_counter()  # ⏱️ server-side rerun latency, shown in the footer
 import streamlit as st
 import pandas as pd
 import sqlite3
-import time
-import re
 import os
 import base64
 import yaml
 import shutil
 import streamlit_authenticator as stauth
 from yaml.loader import SafeLoader
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from urllib.parse import quote
+import jobs
+import exports
+import metrics
+from db import DB_NAME, init_db, has_fts, fts_query
 
 # ==============================================================================
 # 1. GLOBAL CONFIGURATION & STATE (RESTORING APP 16 LOGIC)
@@ -24,9 +22,10 @@ st.set_page_config(page_title="ChatScrap Elite Pro", layout="wide", page_icon="
 if 'results_list' not in st.session_state: st.session_state.results_list = []
 if 'running' not in st.session_state: st.session_state.running = False
 if 'paused' not in st.session_state: st.session_state.paused = False
-if 'task_index' not in st.session_state: st.session_state.task_index = 0
 if 'progress' not in st.session_state: st.session_state.progress = 0
 if 'current_sid' not in st.session_state: st.session_state.current_sid = None
+if 'job_id' not in st.session_state: st.session_state.job_id = None
+if 'live_sid' not in st.session_state: st.session_state.live_sid = None
 
 if 'active_kw' not in st.session_state: st.session_state.active_kw = ""
 if 'active_city' not in st.session_state: st.session_state.active_city = ""
@@ -70,27 +69,14 @@ else:
     """, unsafe_allow_html=True)
 
 # ==============================================================================
-# 3. DATABASE (V9 RESTORED + SMART MIGRATION)
+# 3. DATABASE (V9 RESTORED + SMART MIGRATION, see db.py)
 # ==============================================================================
-DB_NAME = "chatscrap_elite_pro_v9.db"
-
-def init_db():
-    with sqlite3.connect(DB_NAME, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, date TEXT)")
-        cursor.execute("""CREATE TABLE IF NOT EXISTS leads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER, 
-            keyword TEXT, city TEXT, country TEXT, name TEXT, phone TEXT, 
-            website TEXT, email TEXT, address TEXT, whatsapp TEXT)""")
-        cursor.execute("CREATE TABLE IF NOT EXISTS user_credits (username TEXT PRIMARY KEY, balance INTEGER, status TEXT DEFAULT 'active')")
-        
-        # SMART MIGRATION: Auto-add columns for Ratings & Social Media
-        cols = [c[1] for c in cursor.execute("PRAGMA table_info(leads)").fetchall()]
-        for col in ["rating", "social_media"]:
-            if col not in cols: cursor.execute(f"ALTER TABLE leads ADD COLUMN {col} TEXT")
-        conn.commit()
-
-init_db()
+@st.cache_resource
+def init_schema():
+    """ Schema + smart migration once per server process, not on every rerun. """
+    init_db(); exports.sweep_exports(); return True
+
+init_schema()
 
 def get_user_data(username):
     with sqlite3.connect(DB_NAME) as conn:
@@ -102,15 +88,27 @@ def get_user_data(username):
 # ==============================================================================
 # 4. AUTHENTICATION & LOGIN (RAISED LOGO)
 # ==============================================================================
-try:
+@st.cache_data
+def load_config():
+    """ config.yaml parsed once; cache_data hands every rerun its own copy. Cleared when a user is added. """
     with open('config.yaml') as file: config = yaml.load(file, Loader=SafeLoader)
+    # Plain-text passwords would be bcrypt-hashed by Authenticate on every rerun (~0.3 s each): hash them once here
+    try: config['credentials'] = stauth.Hasher.hash_passwords(config['credentials'])
+    except AttributeError: pass
+    return config
+
+@st.cache_resource
+def logo_b64():
+    if not os.path.exists("chatscrape.png"): return None
+    with open("chatscrape.png", "rb") as f: return base64.b64encode(f.read()).decode()
+
+try: config = load_config()
 except: st.error("config.yaml missing"); st.stop()
 
 authenticator = stauth.Authenticate(config['credentials'], config['cookie']['name'], config['cookie']['key'], config['cookie']['expiry_days'])
 
 if st.session_state.get("authentication_status") is not True:
-    if os.path.exists("chatscrape.png"):
-        with open("chatscrape.png", "rb") as f: b64 = base64.b64encode(f.read()).decode()
+    if b64 := logo_b64():
         st.markdown(f'<div style="text-align:center; padding-top: 100px; padding-bottom: 20px;"><img src="data:image/png;base64,{b64}" style="width:320px; filter: drop-shadow(0 0 15px rgba(255,140,0,0.3));"></div>', unsafe_allow_html=True)
     
     col1, col2, col3 = st.columns([1, 1.2, 1])
@@ -153,6 +151,7 @@ with st.sidebar:
                     except: hashed_pw = stauth.Hasher([np]).generate()[0]
                     config['credentials']['usernames'][nu] = {'name': nu, 'password': hashed_pw, 'email': 'x'}
                     with open('config.yaml', 'w') as f: yaml.dump(config, f)
+                    load_config.clear()
                     get_user_data(nu); st.success(f"User {nu} Created!"); st.rerun()
 
     st.divider()
@@ -161,10 +160,19 @@ with st.sidebar:
 # ==============================================================================
 # 6. MAIN APP HEADER & INPUTS
 # ==============================================================================
-if os.path.exists("chatscrape.png"):
-    with open("chatscrape.png", "rb") as f: b64 = base64.b64encode(f.read()).decode()
+if b64 := logo_b64():
     st.markdown(f'<div class="centered-logo"><img src="data:image/png;base64,{b64}" class="logo-img"></div>', unsafe_allow_html=True)
 
+# 🔥 JOB SYNC: running/paused come from the job queue, so a refresh re-attaches to the user's active job
+if st.session_state.job_id is None:
+    aj = jobs.active_job(me)
+    if aj: st.session_state.job_id, st.session_state.current_sid = aj
+job = jobs.job_progress(st.session_state.job_id) if st.session_state.job_id else None
+if job:
+    st.session_state.running, st.session_state.paused = job["status"] in ('running', 'paused'), job["status"] == 'paused'
+    st.session_state.progress = job["progress"]
+    if st.session_state.running: jobs.ensure_workers()
+
 with st.container():
     c1, c2, c3, c4 = st.columns([3, 3, 2, 1.5])
     kw_in = c1.text_input("Keywords", placeholder="e.g. cafe, hotel", key="kw_in_key")
@@ -183,6 +191,7 @@ with st.container():
     
     f6, f7, f8 = st.columns([1.5, 1.5, 2.5])
     w_neg = f6.checkbox("⭐ Negative Filter (<3.5)", False)
+    w_fast = f7.checkbox("⚡ Fast Cards", True, help="Read results straight from the list; only open a place when its card misses a field")
     depth_in = f8.slider("Scroll Depth", 1, 100, 10)
 
     st.write("")
@@ -192,182 +201,177 @@ with st.container():
         if st.button("Start Search", disabled=st.session_state.running):
             if kw_in and city_in:
                 st.session_state.active_kw, st.session_state.active_city = kw_in, city_in
-                st.session_state.running, st.session_state.paused = True, False
-                st.session_state.results_list, st.session_state.progress, st.session_state.task_index = [], 0, 0
-                with sqlite3.connect(DB_NAME) as conn:
-                    cur = conn.cursor(); cur.execute("INSERT INTO sessions (query, date) VALUES (?, ?)", (f"{kw_in} | {city_in}", time.strftime("%Y-%m-%d %H:%M")))
-                    st.session_state.current_sid = cur.lastrowid; conn.commit()
-                st.rerun()
+                st.session_state.results_list, st.session_state.progress = [], 0
+                opts = {"phone_only": w_phone, "website": w_web, "email": w_email, "social": w_social, "global_dedupe": w_global, "negative": w_neg, "fast": w_fast}
+                st.session_state.job_id, st.session_state.current_sid = jobs.enqueue_job(me, kw_in, city_in, country_in, limit_in, depth_in, opts)
+                jobs.ensure_workers(); st.rerun()
 
     with b_pause:
-        if st.button("Pause", disabled=not st.session_state.running or st.session_state.paused): st.session_state.paused = True; st.rerun()
+        if st.button("Pause", disabled=not st.session_state.running or st.session_state.paused): jobs.set_job_status(st.session_state.job_id, 'paused'); st.rerun()
     with b_cont:
-        if st.button("Continue", disabled=not st.session_state.running or not st.session_state.paused): st.session_state.paused = False; st.rerun()
+        if st.button("Continue", disabled=not st.session_state.running or not st.session_state.paused): jobs.set_job_status(st.session_state.job_id, 'running'); st.rerun()
     with b_stop:
-        if st.button("Stop Search", disabled=not st.session_state.running): st.session_state.running, st.session_state.paused = False, False; st.rerun()
+        if st.button("Stop Search", disabled=not st.session_state.running): jobs.set_job_status(st.session_state.job_id, 'stopped'); st.rerun()
 
 # ==============================================================================
-# 8. ENGINE & ROBUST LOGIC (ROOT FIX FOR REVIEWS & WHATSAPP)
+# 8. LIVE DATA (ENGINE RUNS IN THE JOB WORKERS, SEE jobs.py / engine.py)
 # ==============================================================================
-def get_driver():
-    opts = Options(); opts.add_argument("--headless=new"); opts.add_argument("--no-sandbox"); opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1920,1080")
-    try: return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=opts)
-    except: return webdriver.Chrome(options=opts)
-
-def safe_math_rating(text):
-    """ Converts text like '4.1 stars' to float safely. Returns 5.0 for N/A. """
-    try:
-        if not text or text == "N/A": return 5.0
-        match = re.findall(r"(\d+\.\d+|\d+)", text)
-        return float(match[0]) if match else 5.0
-    except: return 5.0
-
-def fetch_deep_site(driver, url, find_socials, find_email):
-    social, em = "N/A", "N/A"
-    if not url or url == "N/A": return social, em
-    try:
-        driver.execute_script("window.open('');"); driver.switch_to.window(driver.window_handles[-1])
-        driver.set_page_load_timeout(10); driver.get(url); time.sleep(3); src = driver.page_source.lower()
-        if find_socials:
-            patterns = [r'instagram\.com/[a-zA-Z0-9_.]+', r'facebook\.com/[a-zA-Z0-9_.]+', r'linkedin\.com/company/[a-zA-Z0-9_-]+']
-            for p in patterns:
-                m = re.findall(p, src); 
-                if m: social = m[0]; break
-        if find_email:
-            em_m = re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", src)
-            em = list(set(em_m))[0] if em_m else "N/A"
-        driver.close(); driver.switch_to.window(driver.window_handles[0])
-    except:
-        if len(driver.window_handles)>1: driver.close(); driver.switch_to.window(driver.window_handles[0])
-    return social, em
-
-tab_live, tab_archive, tab_tools = st.tabs(["⚡ Live Data", "📜 Archives", "🤖 Marketing"])
-
-with tab_live:
+LIVE_COLS = {"keyword": "Keyword", "city": "City", "name": "Name", "phone": "Phone", "whatsapp": "WhatsApp",
+             "website": "Website", "email": "Email", "rating": "Rating/Reviews", "social_media": "Social Media"}
+POLL_EVERY = 1.5   # bounded refresh rate of the live view while a job runs
+LIVE_PAGE = 50     # rows rendered per live table page
+
+def export_ui(key, label, query, fmt="CSV", name="leads"):
+    """ 📦 Builds an export on click and lists download links to its files. The files are served from the static folder
+    (exports.py), never read into this process; the links survive reruns until rebuilt or swept. """
+    if st.button(label, key=f"prep_{key}"): st.session_state[f"export_{key}"] = exports.export_file(query, fmt, name)
+    paths, n = st.session_state.get(f"export_{key}") or ([], 0)
+    if paths and all(os.path.exists(p) for p in paths):
+        ext = exports.FORMATS[fmt]
+        links = [f'<a href="{exports.export_url(p)}" download="{name}{f"_part{i}" if len(paths) > 1 else ""}{ext}">⬇️ {name}{f" part {i}" if len(paths) > 1 else ""}{ext}</a>'
+                 for i, p in enumerate(paths, 1)]
+        st.markdown(f"{n} leads: " + " · ".join(links), unsafe_allow_html=True)
+
+# Only the selected view runs its queries on a rerun (st.tabs would execute every tab's body every time)
+VIEWS = ["⚡ Live Data", "📜 Archives", "📈 Performance", "🤖 Marketing"]
+view = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed", key="view")
+
+if view == "⚡ Live Data":
     prog_spot, status_ui, table_ui, download_ui = st.empty(), st.empty(), st.empty(), st.empty()
     prog_spot.markdown(f'<div class="prog-container"><div class="prog-bar-fill" style="width: {st.session_state.progress}%;"></div></div>', unsafe_allow_html=True)
 
-    if st.session_state.results_list:
-        df_live = pd.DataFrame(st.session_state.results_list)
-        table_ui.write(df_live.to_html(escape=False, index=False), unsafe_allow_html=True)
-        download_ui.download_button(label="⬇️ Export Leads CSV", data=df_live.to_csv(index=False).encode('utf-8'), file_name="leads.csv", mime="text/csv")
-
-    if st.session_state.running and not st.session_state.paused:
-        akws = [k.strip() for k in st.session_state.active_kw.split(',') if k.strip()]
-        acts = [c.strip() for c in st.session_state.active_city.split(',') if c.strip()]
-        all_tasks = [(c, k) for c in acts for k in akws]
-        
-        if all_tasks:
-            driver = get_driver()
-            try:
-                total_est = len(all_tasks) * limit_in
-                for i, (city, kw) in enumerate(all_tasks):
-                    if i < st.session_state.task_index: continue
-                    if not st.session_state.running: break
-                    base_progress = i * limit_in
-                    status_ui.markdown(f"**Scanning:** `{kw}` in `{city}`... ({i+1}/{len(all_tasks)})")
-                    driver.get(f"https://www.google.com/maps/search/{quote(kw)}+in+{quote(city)}?hl=en&gl=ma")
-                    time.sleep(5)
-                    try:
-                        pane = driver.find_element(By.CSS_SELECTOR, 'div[role="feed"]')
-                        for _ in range(depth_in): driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", pane); time.sleep(1)
-                    except: pass
-                    
-                    items = driver.find_elements(By.XPATH, '//a[contains(@href, "/maps/place/")]')
-                    processed = 0
-                    for item in items:
-                        if processed >= limit_in or not st.session_state.running: break
-                        try:
-                            driver.execute_script("arguments[0].click();", item); time.sleep(3)
-                            name = driver.find_element(By.CSS_SELECTOR, "h1.DUwDvf").text
-                            phone = "N/A"
-                            try: phone = driver.find_element(By.XPATH, '//*[contains(@data-item-id, "phone:tel")]').get_attribute("aria-label").replace("Phone: ", "")
-                            except: pass
-                            
-                            if w_phone and (phone == "N/A" or not phone): continue
-                            
-                            # 🔥 GLOBAL DEDUPE PRO
-                            if w_global:
-                                with sqlite3.connect(DB_NAME) as conn:
-                                    if conn.execute("SELECT 1 FROM leads WHERE name=? AND phone=?", (name, phone)).fetchone(): continue
-
-                            # 🔥 ROOT FIX: FULL ARIA-LABEL RATING & REVIEWS EXTRACTION
-                            full_review = "N/A"; r_numeric = 5.0
-                            try:
-                                stars_el = driver.find_element(By.XPATH, '//span[contains(@aria-label, "stars")]')
-                                stars_txt = stars_el.get_attribute("aria-label") 
-                                try:
-                                    rev_el = driver.find_element(By.XPATH, '//span[contains(@aria-label, "reviews")]')
-                                    rev_txt = rev_el.text if rev_el.text else rev_el.get_attribute("aria-label")
-                                    full_review = f"{stars_txt} ({rev_txt})"
-                                except: full_review = stars_txt
-                                r_numeric = safe_math_rating(stars_txt)
-                            except: pass
-
-                            # 🔥 ROOT FIX: ANTI-FREEZE FILTER (No Freeze)
-                            if w_neg and r_numeric >= 3.5: continue
-
-                            st.session_state.progress = min(int(((base_progress + processed + 1) / total_est) * 100), 100)
-                            prog_spot.markdown(f'<div class="prog-container"><div class="prog-bar-fill" style="width: {st.session_state.progress}%;"></div></div>', unsafe_allow_html=True)
-
-                            maps_web = "N/A"
-                            try: maps_web = driver.find_element(By.CSS_SELECTOR, 'a[data-item-id="authority"]').get_attribute("href")
-                            except: pass
-                            
-                            # 🔥 ROOT FIX: SOCIAL CLASSIFIER (Moves Socials from Website to Social column)
-                            final_web = maps_web; social_found = "N/A"
-                            if any(x in str(maps_web).lower() for x in ["facebook.com", "instagram.com", "linkedin.com", "twitter.com"]):
-                                social_found = maps_web; final_web = "N/A"
-
-                            # Deep site crawl
-                            email = "N/A"
-                            if final_web != "N/A" and (w_social or w_email):
-                                s_crawl, em_crawl = fetch_deep_site(driver, final_web, w_social, w_email)
-                                if social_found == "N/A": social_found = s_crawl
-                                email = em_crawl
-
-                            # 🔥 DIRECT WHATSAPP LINK FIX
-                            wa = "N/A"; cp = re.sub(r'\D', '', phone)
-                            if any(cp.startswith(x) for x in ['2126','2127','06','07']) and not (cp.startswith('2125') or cp.startswith('05')):
-                                if cp.startswith('0'): cp = '212' + cp[1:]
-                                wa = f'<a href="https://api.whatsapp.com/send?phone={cp}" target="_blank" class="wa-link"><i class="fab fa-whatsapp"></i> Chat Now</a>'
-                            
-                            row = {"Keyword":kw, "City":city, "Name":name, "Phone":phone, "WhatsApp":wa, 
-                                   "Website": final_web if w_web else "N/A", "Email": email if w_email else "N/A",
-                                   "Rating/Reviews": full_review, "Social Media": social_found if w_social else "N/A"}
-                            
-                            with sqlite3.connect(DB_NAME) as conn:
-                                conn.execute("""INSERT INTO leads (session_id, keyword, city, country, name, phone, website, email, whatsapp, rating, social_media)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", (st.session_state.current_sid, kw, city, country_in, name, phone, row["Website"], row["Email"], wa, full_review, social_found))
-                                if me != 'admin': conn.execute("UPDATE user_credits SET balance=balance-1 WHERE username=?", (me,))
-                                conn.commit()
-                            
-                            st.session_state.results_list.append(row); table_ui.write(pd.DataFrame(st.session_state.results_list).to_html(escape=False, index=False), unsafe_allow_html=True)
-                            processed += 1
-                        except Exception: continue
-                    st.session_state.task_index += 1
-                if st.session_state.task_index >= len(all_tasks) and st.session_state.running:
-                    st.success("🏁 Extraction Finished!"); st.session_state.running = False
-            finally: driver.quit()
+    # 🔥 INCREMENTAL LIVE VIEW: only rows newer than the last one seen are fetched and appended
+    sid = st.session_state.current_sid
+    if sid != st.session_state.live_sid: st.session_state.results_list, st.session_state.live_sid = [], sid
+    if sid:
+        last_id = st.session_state.results_list[-1]["id"] if st.session_state.results_list else 0
+        with sqlite3.connect(DB_NAME) as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(LIVE_COLS)} FROM leads WHERE session_id=? AND id>? ORDER BY id", (sid, last_id)).fetchall()
+        st.session_state.results_list.extend(dict(zip(["id", *LIVE_COLS.values()], r)) for r in rows)
+
+    if job:
+        if job["status"] == 'running': status_ui.markdown(f"**Scanning:** {', '.join(job['current']) or 'waiting for a worker...'} ({job['done']}/{job['total']} tasks done)")
+        elif job["status"] == 'paused': status_ui.markdown(f"**Paused** ({job['done']}/{job['total']} tasks done)")
+        elif job["status"] == 'done': st.success("🏁 Extraction Finished!")
+        # 🗃️ Result cache hit rates of this job (places not clicked again, websites not crawled again)
+        hits = [f"{label} {h}/{n} ({h * 100 // n}%)" for kind, label in [("place", "places"), ("site", "websites")] for h, n in [job["cache"].get(kind, (0, 0))] if n]
+        if hits: st.caption("🗃️ Cache hits: " + " · ".join(hits))
+
+    results = st.session_state.results_list
+    if results:
+        # Windowed render: newest page first, only LIVE_PAGE rows become HTML
+        pages = (len(results) - 1) // LIVE_PAGE + 1
+        pg = st.number_input(f"Page (newest first, {len(results)} leads)", 1, pages, 1, key="live_page") if pages > 1 else 1
+        window = results[::-1][(pg - 1) * LIVE_PAGE: pg * LIVE_PAGE]
+        # Website crawls land after the row was appended: refresh just this window's enrichment columns
+        with sqlite3.connect(DB_NAME) as conn:
+            fresh = dict((r[0], r[1:]) for r in conn.execute(f"SELECT id, email, social_media FROM leads WHERE id IN ({','.join('?' * len(window))})", [r["id"] for r in window]))
+        for r in window:
+            if r["id"] in fresh: r["Email"], r["Social Media"] = fresh[r["id"]]
+        table_ui.write(pd.DataFrame(window).drop(columns=["id"]).to_html(escape=False, index=False), unsafe_allow_html=True)
+
+        # CSV is built on demand from the database, never on a plain rerun or poll
+        with download_ui.container(): export_ui(f"live_{sid}", "📦 Prepare Leads CSV", exports.lead_query([sid], columns=LIVE_COLS))
 
 # ==============================================================================
 # 9. ARCHIVE & MARKETING (RESTORED FROM APP 16)
 # ==============================================================================
-with tab_archive:
+ARCHIVE_PAGE = 30   # sessions per archive page
+LEADS_PAGE = 50     # leads per archive/search page
+ARCHIVE_COLS = ", ".join(exports.LEAD_COLS)
+
+def keyset_cursor(key, sig):
+    """ Keyset pagination state: a stack of cursors in session_state[key], reset whenever sig (the filter) changes. """
+    if st.session_state.get(f"{key}_sig") != sig: st.session_state[key], st.session_state[f"{key}_sig"] = [None], sig
+    return st.session_state[key][-1]
+
+def keyset_nav(key, next_cursor, labels=("◀ Newer", "Older ▶")):
+    stack = st.session_state[key]
+    n1, n2, _ = st.columns([1, 1, 4])
+    if n1.button(labels[0], key=f"{key}_prev", disabled=len(stack) == 1): stack.pop(); st.rerun()
+    if n2.button(labels[1], key=f"{key}_next", disabled=next_cursor is None): stack.append(next_cursor); st.rerun()
+
+def page_of(df, size):
+    """ Splits a size+1 row fetch into (page, cursor of the next page or None). """
+    return df.head(size), (int(df['id'].iloc[size - 1]) if len(df) > size else None)
+
+if view == "📜 Archives":
     st.subheader("Persistent History")
-    search_f = st.text_input("Filter History", placeholder="🔍 Search...")
-    with sqlite3.connect(DB_NAME) as conn:
-        df_s = pd.read_sql("SELECT * FROM sessions WHERE query LIKE ? ORDER BY id DESC LIMIT 30", conn, params=(f"%{search_f}%",))
-    if not df_s.empty:
-        for _, sess in df_s.iterrows():
-            with st.expander(f"📦 {sess['date']} | {sess['query']}"):
-                with sqlite3.connect(DB_NAME) as conn: df_l = pd.read_sql(f"SELECT * FROM leads WHERE session_id={sess['id']}", conn)
+    a1, a2 = st.columns(2)
+    search_f = a1.text_input("Filter History", placeholder="🔍 Search...")
+    search_l = a2.text_input("Search All Leads", placeholder="🔎 name, city, keyword, address, email...")
+
+    if search_l.strip():
+        # 🔥 FTS5 SEARCH ACROSS ALL HISTORY (newest first, keyset on rowid)
+        cur_id = keyset_cursor("fts_pg", search_l)
+        with sqlite3.connect(DB_NAME) as conn:
+            if has_fts(conn):
+                df_f = pd.read_sql(f"""SELECT l.id, s.date, {', '.join('l.' + c for c in ARCHIVE_COLS.split(', '))} FROM leads_fts f
+                    JOIN leads l ON l.id = f.rowid LEFT JOIN sessions s ON s.id = l.session_id
+                    WHERE leads_fts MATCH ? AND f.rowid < ? ORDER BY f.rowid DESC LIMIT ?""", conn, params=(fts_query(search_l), cur_id or 2**62, LEADS_PAGE + 1))
+            else:
+                like = f"%{search_l.strip()}%"
+                df_f = pd.read_sql(f"""SELECT l.id, s.date, {', '.join('l.' + c for c in ARCHIVE_COLS.split(', '))} FROM leads l LEFT JOIN sessions s ON s.id = l.session_id
+                    WHERE (l.name LIKE ? OR l.city LIKE ? OR l.keyword LIKE ? OR l.address LIKE ? OR l.email LIKE ?) AND l.id < ? ORDER BY l.id DESC LIMIT ?""",
+                    conn, params=(like,) * 5 + (cur_id or 2**62, LEADS_PAGE + 1))
+        df_f, nxt = page_of(df_f, LEADS_PAGE)
+        if df_f.empty: st.info("No leads match this search.")
+        else: st.write(df_f.drop(columns=['id']).to_html(escape=False, index=False), unsafe_allow_html=True)
+        keyset_nav("fts_pg", nxt)
+    else:
+        # 🔥 LAZY SESSIONS: one page of session headers; only the opened session's leads are queried
+        cur_id = keyset_cursor("sess_pg", search_f)
+        with sqlite3.connect(DB_NAME) as conn:
+            df_s = pd.read_sql("SELECT id, date, query FROM sessions WHERE query LIKE ? AND id < ? ORDER BY id DESC LIMIT ?", conn, params=(f"%{search_f}%", cur_id or 2**62, ARCHIVE_PAGE + 1))
+        df_s, nxt = page_of(df_s, ARCHIVE_PAGE)
+        if not df_s.empty:
+            labels = {int(r['id']): f"📦 {r['date']} | {r['query']}" for _, r in df_s.iterrows()}
+            sel = st.selectbox("Open Session", list(labels), format_func=labels.get, index=None, placeholder="📦 Pick a session to load its leads")
+            keyset_nav("sess_pg", nxt, ("◀ Newer sessions", "Older sessions ▶"))
+            if sel is not None:
+                lead_id = keyset_cursor("lead_pg", sel)
+                with sqlite3.connect(DB_NAME) as conn:
+                    total = conn.execute("SELECT COUNT(*) FROM leads WHERE session_id=?", (sel,)).fetchone()[0]
+                    df_l = pd.read_sql(f"SELECT id, {ARCHIVE_COLS} FROM leads WHERE session_id=? AND id > ? ORDER BY id LIMIT ?", conn, params=(sel, lead_id or 0, LEADS_PAGE + 1))
+                df_l, nxt_l = page_of(df_l, LEADS_PAGE)
                 if not df_l.empty:
-                    st.write(df_l.drop(columns=['id', 'session_id']).to_html(escape=False, index=False), unsafe_allow_html=True)
-                    st.download_button(label="⬇️ Export CSV", data=df_l.to_csv(index=False).encode('utf-8'), file_name=f"archive_{sess['id']}.csv", key=f"btn_{sess['id']}")
-
-with tab_tools:
+                    st.caption(f"{total} leads")
+                    st.write(df_l.drop(columns=['id']).to_html(escape=False, index=False), unsafe_allow_html=True)
+                    keyset_nav("lead_pg", nxt_l, ("◀ Previous", "Next ▶"))
+                    export_ui(f"arch_{sel}", "📦 Prepare CSV", exports.lead_query([sel]), name=f"archive_{sel}")
+
+    # 🔥 BULK EXPORT: streams every lead of the current search (or of all sessions matching the history filter)
+    with st.expander("📤 Bulk Export"):
+        scope = f"search '{search_l.strip()}'" if search_l.strip() else (f"sessions matching '{search_f}'" if search_f else "all sessions")
+        st.caption(f"Exports every lead of {scope}.")
+        fmt = st.selectbox("Format", [*exports.FORMATS, "Google Sheets"], key="exp_fmt")
+        spec = {"session_like": None if search_l.strip() else search_f, "search": search_l}
+        query = exports.lead_query(**spec)
+        if fmt == "Google Sheets":
+            sa_file = st.text_input("Service Account JSON", value=config.get('gsheets', {}).get('service_account', ''), key="exp_sa")
+            sheet_url = st.text_input("Sheet URL", key="exp_url")
+            # The push runs in a background process (exports.py): reruns and clicks don't interrupt it
+            push = exports.last_push(me)
+            busy = bool(push) and push["status"] in ("queued", "running") and not push["stalled"]
+            if st.button("📤 Push to Sheet", disabled=busy or not (sa_file and sheet_url)):
+                exports.start_push(me, spec, sa_file, sheet_url); st.rerun()
+
+            @st.fragment(run_every=2 if busy else None)
+            def push_status():
+                p = exports.last_push(me)
+                if not p: return
+                if p["status"] == "done": st.success(f"{p['rows']} leads pushed.")
+                elif p["status"] == "failed" or p["stalled"]:
+                    st.error(f"Sheets push stopped after {p['rows']} leads: {p['error'] or 'no progress'}")
+                    if st.button("↻ Resume push", key="push_resume"): exports.resume_push(p["id"]); st.rerun()
+                else: st.info(f"📤 Pushing to Sheets... {p['rows']} leads sent")
+                if busy and p["status"] not in ("queued", "running"): st.rerun()  # finished: re-enable the push button
+            push_status()
+        elif fmt == "Parquet" and not exports.HAS_PYARROW: st.error("Parquet export needs pyarrow (pip install pyarrow)")
+        else:
+            export_ui(f"bulk_{fmt}", "📦 Build Export", query, fmt, "export")
+
+if view == "🤖 Marketing":
     st.subheader("🤖 AI Personalized Messaging")
     with sqlite3.connect(DB_NAME) as conn:
         all_leads = pd.read_sql("SELECT name, keyword, rating FROM leads ORDER BY id DESC LIMIT 50", conn)
@@ -378,4 +382,50 @@ with tab_tools:
         st.text_area("Generated Outreach Message:", msg, height=100)
     else: st.warning("No leads found. Start a search first!")
 
-st.markdown('<div style="text-align:center;color:#666;padding:30px;">Designed by Chatir Elite Pro - Architect Edition V95</div>', unsafe_allow_html=True)
+# ==============================================================================
+# 10. PERFORMANCE (STAGE TIMINGS & FAILURE RATES RECORDED BY THE WORKERS, SEE metrics.py)
+# ==============================================================================
+BUSY_STAGES = ["search", "scroll", "click", "extract", "dedupe"]   # time a browser page is tied up
+
+if view == "📈 Performance":
+    st.subheader("📈 Performance")
+    with sqlite3.connect(DB_NAME) as conn:
+        recent = conn.execute("""SELECT id, query, date FROM sessions s WHERE EXISTS (SELECT 1 FROM metrics m WHERE m.session_id = s.id)
+            ORDER BY id DESC LIMIT 30""").fetchall()
+    if not recent: st.info("No metrics yet. They are recorded while a search runs.")
+    else:
+        labels = {r[0]: f"#{r[0]} · {r[1]} ({r[2]})" for r in recent}
+        default = [st.session_state.current_sid] if st.session_state.current_sid in labels else [recent[0][0]]
+        picked = st.multiselect("Sessions", list(labels), default=default, format_func=labels.get, key="perf_sessions")
+        with sqlite3.connect(DB_NAME) as conn:
+            by = {r[0]: r[1:] for r in metrics.stage_breakdown(conn, picked)}
+            per_min, fails = metrics.throughput(conn, picked), metrics.failures(conn, picked)
+
+        # 🔥 STAGE BREAKDOWN: where the time went
+        total = sum(by[s][1] for s in metrics.STAGES if s in by) or 1
+        stages = pd.DataFrame([{"Stage": s, "Calls": c, "Total (s)": round(sec, 1), "Avg (ms)": round(sec / c * 1000) if c else 0,
+                                "Share": f"{sec / total:.0%}", "Not found": mi, "Errors": er} for s in metrics.STAGES if s in by for c, sec, mi, er in [by[s]]])
+        if not stages.empty:
+            p1, p2 = st.columns([3, 2])
+            p1.dataframe(stages, hide_index=True)
+            p2.bar_chart(stages.set_index("Stage")["Total (s)"])
+        leads, busy = (by.get("lead") or (0,))[0], sum(by[s][1] for s in BUSY_STAGES if s in by)
+        if leads and busy: st.caption(f"≈ {busy / leads:.2f} s of browser page time per saved lead → one page sustains ≈ {60 * leads / busy:.0f} leads/min")
+
+        # 🔥 THROUGHPUT OVER TIME (leads saved per minute)
+        if per_min:
+            st.markdown("**Leads per minute**")
+            st.line_chart(pd.DataFrame(per_min, columns=["minute", "Leads"]).assign(minute=lambda d: pd.to_datetime(d["minute"] * 60, unit="s")).set_index("minute"))
+
+        # 🔥 FAILURE RATES PER (CITY, KEYWORD): selectors drifting show up here first
+        if fails:
+            pct = lambda a, b: f"{(a or 0) / b:.0%}" if b else "-"
+            st.markdown("**Failure rates per city / keyword**")
+            st.dataframe(pd.DataFrame([{"City": f[0], "Keyword": f[1], "Places": f[2] or 0, "Leads": f[4] or 0, "Abandoned": pct(f[3], f[2]),
+                                        "Search not found": f[5] or 0, "Panel not shown": pct(f[7], f[6]), "Name/phone not found": pct(f[9], f[8]),
+                                        "Rating not found": pct(f[11], f[8]), "Website not found": pct(f[12], f[8]), "Stage errors": f[10] or 0} for f in fails]), hide_index=True)
+
+st.markdown(f'<div style="text-align:center;color:#666;padding:30px;">Designed by Chatir Elite Pro - Architect Edition V95 · ⏱️ {(time.perf_counter() - RERUN_T0) * 1000:.0f} ms</div>', unsafe_allow_html=True)
+
+# 🔥 POLLER: the job runs in the workers, the UI just re-reads its progress (only while the live view is open)
+if st.session_state.running and not st.session_state.paused and view == "⚡ Live Data": time.sleep(POLL_EVERY); st.rerun()
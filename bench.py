@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import itertools
+import selectors
+import threading
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==============================================================================
+# OFFLINE BENCHMARK (LOCAL MAPS-LIKE FIXTURE SERVER)
+# `python bench.py` serves synthetic Maps feeds, place panels and business
+# websites from the loopback network and runs real job workers (jobs.py ->
+# engine.py -> enrich.py) against them through CHATSCRAP_MAPS_URL. Every
+# configuration starts from a fresh database; leads/min, per-lead latency
+# percentiles and peak memory are appended to RESULTS so runs can be compared.
+# ==============================================================================
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, "bench_results.jsonl")
+PLACES = 120        # results per search feed
+FEED_PAGE = 20      # results rendered per feed load / scroll
+DELAY = 0.05        # simulated Maps latency (s) of a scroll or a place panel switch
+IDLE_EXIT = 2       # workers quit this soon after the queue is empty
+KEYWORDS, CITIES = "cafe, coffee shop, hotel", "Agadir, Rabat"
+OPTIONS = {"phone_only": True, "website": True, "email": True, "social": True, "global_dedupe": False, "negative": False, "fast": False}
+
+# ------------------------------------------------------------------------------
+# FIXTURES: deterministic businesses per (keyword, city); each city has one pool of
+# 2 x PLACES businesses and every keyword sees an overlapping slice of it
+# ------------------------------------------------------------------------------
+def _seed(*parts):
+    return int.from_bytes(hashlib.blake2b("|".join(parts).encode(), digest_size=8).digest(), "little")
+
+def site_host(city, j):
+    """ Website j of a city's pool gets its own loopback address: the site cache and enricher key on the host. """
+    return f"127.{1 + _seed(city) % 200}.{j // 250}.{j % 250 + 1}"
+
+def businesses(kw, city, places=PLACES, port=80):
+    rng, start = random.Random(_seed(city)), _seed(kw) % places
+    pool = []
+    for j in range(2 * places):
+        fid = f"0x{rng.getrandbits(48):x}:0x{rng.getrandbits(48):x}"
+        host = site_host(city, j)
+        pool.append({"fid": fid, "name": f"{city} Business {j}", "phone": f"+212 6{rng.randrange(10**7, 10**8)}" if rng.random() < 0.85 else "",
+                     "stars": f"{rng.uniform(3, 5):.1f}", "reviews": str(rng.randrange(1, 900)), "site": f"http://{host}:{port}/" if rng.random() < 0.6 else ""})
+    return pool[start:start + places]
+
+def _card(p):
+    web = f'<a data-value="Website" href="{p["site"]}"></a>' if p["site"] else ""
+    return (f'<div class="Nv2PK" style="height:100px"><a href="/maps/place/{p["name"].replace(" ", "+")}/data=!4m7!3m6!1s{p["fid"]}!8m2" aria-label="{p["name"]}">{p["name"]}</a>'
+            f'<span class="UsdlK">{p["phone"]}</span><span role="img" aria-label="{p["stars"]} stars {p["reviews"]} Reviews"></span>{web}</div>')
+
+FEED_JS = """
+const PLACES = %s, PAGE = %d, DELAY = %d, feed = document.querySelector('div[role="feed"]'), panel = document.getElementById('panel');
+let shown = PAGE, loading = false;
+const card = (p) => `<div class="Nv2PK" style="height:100px"><a href="/maps/place/${p.name.replaceAll(' ', '+')}/data=!4m7!3m6!1s${p.fid}!8m2" aria-label="${p.name}">${p.name}</a>`
+    + `<span class="UsdlK">${p.phone}</span><span role="img" aria-label="${p.stars} stars ${p.reviews} Reviews"></span>`
+    + (p.site ? `<a data-value="Website" href="${p.site}"></a>` : '') + '</div>';
+const end = () => { if (shown >= PLACES.length && !document.querySelector('span.HlvSq')) feed.insertAdjacentHTML('beforeend', '<span class="HlvSq">You\\'ve reached the end of the list.</span>'); };
+feed.addEventListener('scroll', () => {
+    if (loading || feed.scrollTop + feed.clientHeight < feed.scrollHeight - 50) return;
+    loading = true;
+    setTimeout(() => { feed.insertAdjacentHTML('beforeend', PLACES.slice(shown, shown + PAGE).map(card).join('')); shown += PAGE; end(); loading = false; }, DELAY);
+});
+document.addEventListener('click', (e) => {
+    const a = e.target.closest('a[href*="/maps/place/"]'); if (!a) return;
+    e.preventDefault();
+    const p = PLACES.find((x) => a.href.includes(x.fid));
+    // Like Maps, the URL switches first and the panel only after DELAY: a panel check on the URL alone reads the previous place
+    history.pushState({}, '', a.href);
+    setTimeout(() => {
+        panel.innerHTML = `<h1 class="DUwDvf">${p.name}</h1>` + (p.phone ? `<button data-item-id="phone:tel:${p.phone}" aria-label="Phone: ${p.phone}"></button>` : '')
+            + `<span aria-label="${p.stars} stars"></span><span aria-label="${p.reviews} reviews">(${p.reviews})</span>`
+            + (p.site ? `<a data-item-id="authority" href="${p.site}"></a>` : '');
+    }, DELAY);
+});
+end();
+"""
+
+def feed_page(query, places, delay, port):
+    """ A search result page: the panel comes first (so panel selectors win over card ones), then the feed with its first page. """
+    kw, _, city = query.partition("+in+")
+    found = businesses(kw, city, places, port)
+    data = json.dumps(found).replace("</", "<\\/")
+    return (f'<html><head><title>{query}</title></head><body><div id="panel"></div>'
+            f'<div role="feed" style="height:600px;overflow-y:scroll">{"".join(_card(p) for p in found[:FEED_PAGE])}</div>'
+            f'<script>{FEED_JS % (data, FEED_PAGE, int(delay * 1000))}</script></body></html>')
+
+SHELL_JS = """
+document.getElementById('app').innerHTML = %s + '<p>Write to ' + ['info', '%s.ma'].join('@') + '</p>';
+"""
+
+def site_page(host, path):
+    """ A business website: email on the homepage, on /contact, nowhere, or rendered by a script in an otherwise
+    empty app shell (which only the browser fallbacks can read); an Instagram link on half of them. """
+    rng, slug = random.Random(_seed(host)), "biz" + host.replace(".", "")
+    where, social = rng.choice(["home", "home", "contact", "js", "none"]), rng.random() < 0.5
+    filler = "<p>" + " ".join(["Welcome to our family business, serving the neighbourhood with care since 1998."] * 3) + "</p>"
+    if path == "/" and where == "js":
+        body = f'<h1>{slug}</h1>{filler}' + (f'<a href="https://instagram.com/{slug}">Instagram</a>' if social else "")
+        return f'<html><head><title>{slug}</title></head><body><div id="app"></div><script>{SHELL_JS % (json.dumps(body), slug)}</script></body></html>'
+    if path == "/":
+        return (f'<html><body><h1>{slug}</h1>{filler}<a href="/contact">Contact us</a>'
+                + (f"<p>Write to info@{slug}.ma</p>" if where == "home" else "")
+                + (f'<a href="https://instagram.com/{slug}">Instagram</a>' if social else "") + "</body></html>")
+    if path == "/contact":
+        return f"<html><body><h1>Contact</h1>{filler}" + (f"<p>Email: hello@{slug}.ma</p>" if where == "contact" else "") + "</body></html>"
+    return None
+
+def serve(cities=CITIES, places=PLACES, delay=DELAY):
+    """ Starts the fixture servers in a daemon thread. Returns (stop, maps base URL). Maps is served on 127.0.0.1 and each
+    website on its own 127.x.y.z address of the cities' pools (Linux routes all of 127/8 to loopback), all on one port. """
+    class Fixtures(BaseHTTPRequestHandler):
+        def do_GET(self):
+            host, port = self.server.server_address
+            path = self.path.split("?")[0]
+            if host == "127.0.0.1": body = feed_page(unquote(path[len("/maps/search/"):]), places, delay, port) if path.startswith("/maps/search/") else None
+            else: body = site_page(host, path)
+            if body is None: return self.send_error(404)
+            data = body.encode()
+            self.send_response(200); self.send_header("Content-Type", "text/html; charset=utf-8"); self.send_header("Content-Length", str(len(data))); self.end_headers()
+            self.wfile.write(data)
+        def log_message(self, *args): pass
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), Fixtures)]
+    port = servers[0].server_address[1]
+    hosts = {site_host(c.strip(), j) for c in cities.split(",") if c.strip() for j in range(2 * places)}
+    try: servers += [ThreadingHTTPServer((h, port), Fixtures) for h in sorted(hosts)]
+    except OSError:
+        for s in servers: s.server_close()
+        raise
+    done = threading.Event()
+    def loop():
+        # One thread for every address: requests are still handled on threads of their own (ThreadingHTTPServer)
+        with selectors.DefaultSelector() as sel:
+            for s in servers:
+                s.daemon_threads = True; sel.register(s, selectors.EVENT_READ)
+            while not done.is_set():
+                for key, _ in sel.select(0.2): key.fileobj.handle_request()
+        for s in servers: s.server_close()
+    thread = threading.Thread(target=loop, daemon=True); thread.start()
+    def stop(): done.set(); thread.join()
+    return stop, f"http://127.0.0.1:{port}/maps"
+
+# ------------------------------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------------------------------
+def _worker(name, backend, pages, log):
+    """ A real jobs.py worker whose TaskSink also logs how long each saved lead took (search, scrolls, clicks
+    and filtered places included) to log. """
+    import jobs
+    init, place, lat = jobs.TaskSink.__init__, jobs.TaskSink.place, []
+    def timed_init(self, *args, **kwargs):
+        init(self, *args, **kwargs); self.bench_t = time.monotonic()
+    def timed_place(self, key, lead, site=None):
+        place(self, key, lead, site)
+        if lead: now = time.monotonic(); lat.append(now - self.bench_t); self.bench_t = now
+    jobs.TaskSink.__init__, jobs.TaskSink.place = timed_init, timed_place
+    try: jobs.async_worker(name, pages) if backend == "playwright" else jobs.worker_loop(name)
+    finally:
+        with open(log, "w") as f: json.dump(lat, f)
+
+def tree_rss():
+    """ Resident memory of this process and all its children (browsers included), None without psutil. """
+    try: import psutil
+    except ImportError: return None
+    total = 0
+    for p in [psutil.Process()] + psutil.Process().children(recursive=True):
+        try: total += p.memory_info().rss
+        except psutil.Error: pass
+    return total
+
+def percentile(values, q):
+    if not values: return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q / 100 * (len(values) - 1)))]
+
+def git_rev():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError: return None
+
+def run(cfg, keywords, cities, work):
+    """ One configuration against the fixtures: enqueue a job in the work dir's database, run workers until they idle out. """
+    import jobs
+    from db import connect, init_db
+    os.chdir(work)  # DB_NAME is relative: the workers share this directory's database
+    init_db()
+    job_id, sid = jobs.enqueue_job("admin", keywords, cities, "Morocco", cfg["limit"], cfg["depth"], dict(OPTIONS, fast=cfg["fast"]))
+    ctx, logs = mp.get_context("spawn"), [os.path.join(work, f"latency-{i}.json") for i in range(cfg["workers"])]
+    procs = [ctx.Process(target=_worker, args=(f"bench-{i}", cfg["backend"], cfg["pages"], logs[i])) for i in range(cfg["workers"])]
+    peak, t0 = [0], time.monotonic()
+    for p in procs: p.start()
+    while (jobs.job_progress(job_id) or {}).get("status") == "running" and any(p.is_alive() for p in procs):
+        peak[0] = max(peak[0], tree_rss() or 0); time.sleep(0.2)
+    seconds = time.monotonic() - t0
+    while any(p.is_alive() for p in procs):  # workers finish the website crawls, then idle out
+        peak[0] = max(peak[0], tree_rss() or 0); time.sleep(0.2)
+    lat = [x for log in logs if os.path.exists(log) for x in json.load(open(log))]
+    with connect() as conn:
+        leads, enriched = conn.execute("SELECT COUNT(*), SUM(email!='N/A' OR social_media!='N/A') FROM leads WHERE session_id=?", (sid,)).fetchone()
+    scope = "tree" if peak[0] else None
+    if not peak[0]:
+        # No psutil: the largest single process (worker or browser) this run() has waited for. Each run() gets a fresh
+        # process of its own (see main), so the figure can't carry over from an earlier configuration.
+        for p in procs: p.join()
+        try: import resource; peak[0], scope = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024, "largest process"
+        except ImportError: pass
+    ms = lambda q: None if percentile(lat, q) is None else round(percentile(lat, q) * 1000)
+    return dict(cfg, leads=leads, enriched=enriched or 0, seconds=round(seconds, 2), leads_per_min=round(leads / seconds * 60, 1),
+                p50_ms=ms(50), p95_ms=ms(95), p99_ms=ms(99), peak_mb=round(peak[0] / 2**20) or None, peak_scope=scope,
+                cache={k: f"{h}/{n}" for k, (h, n) in jobs.job_progress(job_id)["cache"].items()})
+
+def main():
+    parser = argparse.ArgumentParser(description="ChatScrap Elite offline benchmark")
+    ints = lambda s: [int(x) for x in s.split(",")]
+    parser.add_argument("--limits", type=ints, default=[20, 60], help="Limit/City values, e.g. 20,60")
+    parser.add_argument("--depths", type=ints, default=[1, 5], help="scroll depths")
+    parser.add_argument("--workers", type=ints, default=[1, 2], help="worker process counts")
+    parser.add_argument("--pages", type=ints, default=[1, 6], help="concurrent pages per Playwright worker")
+    parser.add_argument("--backend", choices=["playwright", "selenium"], default=None)
+    parser.add_argument("--fast", action="store_true", help="enable Fast Cards")
+    parser.add_argument("--runs", type=int, default=1, help="runs per configuration on the same database (later runs hit a warm cache)")
+    parser.add_argument("--keywords", default=KEYWORDS)
+    parser.add_argument("--cities", default=CITIES)
+    parser.add_argument("--places", type=int, default=PLACES, help="results per search feed")
+    parser.add_argument("--delay", type=float, default=DELAY, help="simulated Maps latency (s)")
+    parser.add_argument("--out", default=RESULTS)
+    args = parser.parse_args()
+
+    stop, base = serve(args.cities, args.places, args.delay)
+    # Read by the spawned workers when they import engine/jobs
+    os.environ["CHATSCRAP_MAPS_URL"], os.environ["CHATSCRAP_IDLE_EXIT"] = base, str(IDLE_EXIT)
+    sys.path.insert(0, HERE)
+    import jobs
+    backend = args.backend or jobs.BACKEND
+    rev, stamp = git_rev(), time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"fixtures at {base} | backend {backend} | rev {rev}")
+    for limit, depth, workers, pages in itertools.product(args.limits, args.depths, args.workers, args.pages if backend == "playwright" else [1]):
+        work = tempfile.mkdtemp(prefix="chatscrap-bench-")
+        for n in range(1, args.runs + 1):
+            cfg = {"backend": backend, "limit": limit, "depth": depth, "workers": workers, "pages": pages, "fast": args.fast, "run": n}
+            # A fresh process per run: its chdir and its children's rusage (peak memory without psutil) stay its own
+            with ProcessPoolExecutor(1, mp_context=mp.get_context("spawn")) as ex: res = ex.submit(run, cfg, args.keywords, args.cities, work).result()
+            res.update(rev=rev, date=stamp, places=args.places, delay=args.delay)
+            with open(args.out, "a") as f: f.write(json.dumps(res) + "\n")
+            print(f"limit={limit:<4} depth={depth:<3} workers={workers:<2} pages={pages:<2} run={n} | {res['leads']:>4} leads "
+                  f"{res['leads_per_min']:>7} /min | p50 {res['p50_ms']} p95 {res['p95_ms']} p99 {res['p99_ms']} ms | peak {res['peak_mb']} MB ({res['peak_scope']}) | cache {res['cache']}")
+    stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import json
+import time
+from urllib.parse import urlparse
+
+# ==============================================================================
+# RESULT CACHE (MAPS PLACES + WEBSITE DOMAINS, TTL + SIZE BOUNDED)
+# Overlapping keywords and repeated searches keep meeting the same businesses:
+# a cached place is never clicked again and a cached domain is never crawled
+# again until its entry expires. Reads use the worker's own connection; writes
+# and hit/miss counters ride the worker's LeadWriter batches.
+# ==============================================================================
+PLACE_TTL = 14 * 86400     # phone/rating/website of a place
+SITE_TTL = 30 * 86400      # email/socials found on a website
+PLACE_MAX = 500_000        # rows kept per table, oldest evicted first
+SITE_MAX = 200_000
+EVICT_EVERY = 600          # seconds between eviction sweeps of a worker
+
+class ResultCache:
+    """ key -> JSON dict in one SQLite table (key, data, fetched). Expired rows read as misses. """
+    def __init__(self, table, kind, ttl, max_rows):
+        self.table, self.kind, self.ttl, self.max_rows = table, kind, ttl, max_rows
+
+    def get(self, conn, key):
+        row = conn.execute(f"SELECT data FROM {self.table} WHERE key=? AND fetched>?", (key, time.time() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, writer, key, data):
+        writer.cache_put(self.table, key, json.dumps(data))
+
+    def evict(self, conn):
+        """ Drops expired rows, then the oldest ones beyond max_rows. """
+        conn.execute(f"DELETE FROM {self.table} WHERE fetched<=?", (time.time() - self.ttl,))
+        conn.execute(f"""DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY fetched
+            LIMIT (SELECT MAX(0, COUNT(*) - ?) FROM {self.table}))""", (self.max_rows,))
+
+PLACES = ResultCache("place_cache", "place", PLACE_TTL, PLACE_MAX)
+SITES = ResultCache("site_cache", "site", SITE_TTL, SITE_MAX)
+
+def site_key(url):
+    """ Website -> cache key: its host without www (every page of a site shares one contact result). """
+    return urlparse(url if "//" in url else "http://" + url).netloc.lower().removeprefix("www.")
+
+def usable(info, opts):
+    """ True when cached place details cover this job: anything that was clicked once is complete,
+    a card-only entry only when it holds the phone (and the website when one is needed). """
+    if not info or not info.get("name"): return False
+    return bool(info.get("clicked") or info.get("phone") and (info.get("website") or not (opts["website"] or opts["social"] or opts["email"])))
+
+_last_evict = 0
+def evict(conn):
+    """ Periodic sweep of both caches (at most every EVICT_EVERY seconds per process). """
+    global _last_evict
+    if time.time() - _last_evict < EVICT_EVERY: return
+    _last_evict = time.time()
+    for c in (PLACES, SITES): c.evict(conn)
+    conn.commit()
+
+def hit_rates(conn, job_id):
+    """ {'place': (hits, lookups), 'site': (hits, lookups)} of one job. """
+    return {kind: (hits, hits + misses) for kind, hits, misses in conn.execute("SELECT kind, hits, misses FROM cache_stats WHERE job_id=?", (job_id,))}
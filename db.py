@@ -0,0 +1,275 @@
+import re
+import sys
+import math
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+
+# ==============================================================================
+# DATABASE (V9 SCHEMA + SMART MIGRATION + JOB QUEUE)
+# ==============================================================================
+DB_NAME = "chatscrap_elite_pro_v9.db"
+
+def connect(db=DB_NAME):
+    """ Opens a connection that waits on locks instead of failing (UI + workers share the file). """
+    return sqlite3.connect(db, timeout=30, check_same_thread=False)
+
+def dedupe_key(name, phone):
+    """ 🛡️ Global dedupe key: digits-only phone + case/whitespace-folded name. """
+    return re.sub(r"\D", "", phone or "") + "|" + " ".join((name or "").casefold().split())
+
+def init_db():
+    with connect() as conn:
+        cursor = conn.cursor()
+        # WAL: archive readers (UI sessions) never block the workers' lead writer and vice versa
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, date TEXT)")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS leads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER,
+            keyword TEXT, city TEXT, country TEXT, name TEXT, phone TEXT,
+            website TEXT, email TEXT, address TEXT, whatsapp TEXT)""")
+        cursor.execute("CREATE TABLE IF NOT EXISTS user_credits (username TEXT PRIMARY KEY, balance INTEGER, status TEXT DEFAULT 'active')")
+
+        # JOB QUEUE: one job per search, one task per (city, keyword), one checkpoint per visited place
+        cursor.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER, username TEXT, country TEXT,
+            lim INTEGER, depth INTEGER, options TEXT, status TEXT DEFAULT 'running', created TEXT)""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER, city TEXT, keyword TEXT,
+            status TEXT DEFAULT 'queued', processed INTEGER DEFAULT 0, worker TEXT, heartbeat REAL)""")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks(job_id, status)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS checkpoints (task_id INTEGER, place TEXT, PRIMARY KEY (task_id, place)) WITHOUT ROWID")
+        cursor.execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, pid INTEGER, heartbeat REAL)")
+
+        # RESULT CACHE (cache.py): place details by Maps place id, crawl results by website domain, hit rates per job
+        for table in ["place_cache", "site_cache"]:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, data TEXT, fetched REAL)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_fetched ON {table}(fetched)")
+        # METRICS (metrics.py): per-stage timings and failure counts of every task, folded by minute
+        cursor.execute("""CREATE TABLE IF NOT EXISTS metrics (session_id INTEGER, task_id INTEGER, stage TEXT, minute INTEGER,
+            calls INTEGER, seconds REAL, misses INTEGER, errors INTEGER, PRIMARY KEY (task_id, stage, minute)) WITHOUT ROWID""")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_session ON metrics(session_id)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS cache_stats (job_id INTEGER, kind TEXT, hits INTEGER, misses INTEGER, PRIMARY KEY (job_id, kind)) WITHOUT ROWID")
+        # SHEETS PUSHES (exports.py): background Google Sheets exports, resumable from the last pushed lead id
+        cursor.execute("""CREATE TABLE IF NOT EXISTS sheet_pushes (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, spec TEXT,
+            service_account TEXT, sheet_url TEXT, status TEXT DEFAULT 'queued', header INTEGER DEFAULT 0, last_id INTEGER DEFAULT 0,
+            rows INTEGER DEFAULT 0, error TEXT, updated REAL, created TEXT)""")
+
+        # SMART MIGRATION: Auto-add columns for Ratings, Social Media & the normalized dedupe key (backfilled once)
+        cols = [c[1] for c in cursor.execute("PRAGMA table_info(leads)").fetchall()]
+        for col in ["rating", "social_media", "dedupe_key"]:
+            if col not in cols: cursor.execute(f"ALTER TABLE leads ADD COLUMN {col} TEXT")
+        if "dedupe_key" not in cols:
+            conn.create_function("dedupe_key", 2, dedupe_key, deterministic=True)
+            cursor.execute("UPDATE leads SET dedupe_key = dedupe_key(name, phone) WHERE dedupe_key IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_dedupe ON leads(dedupe_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_session ON leads(session_id, id)")
+        init_fts(cursor)
+        conn.commit()
+
+# ==============================================================================
+# ARCHIVE FULL-TEXT SEARCH (FTS5 EXTERNAL-CONTENT INDEX OVER leads)
+# ==============================================================================
+FTS_COLS = "name, city, keyword, address, email"
+
+def init_fts(cursor):
+    """ Creates leads_fts + sync triggers and indexes existing history once. No-op on SQLite builds without FTS5. """
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name='leads_fts'").fetchone(): return
+    try: cursor.execute(f"CREATE VIRTUAL TABLE leads_fts USING fts5({FTS_COLS}, content='leads', content_rowid='id')")
+    except sqlite3.OperationalError: return
+    new_cols, old_cols = ", ".join(f"new.{c}" for c in FTS_COLS.split(", ")), ", ".join(f"old.{c}" for c in FTS_COLS.split(", "))
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN INSERT INTO leads_fts(rowid, {FTS_COLS}) VALUES (new.id, {new_cols}); END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN INSERT INTO leads_fts(leads_fts, rowid, {FTS_COLS}) VALUES ('delete', old.id, {old_cols}); END")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF {FTS_COLS} ON leads BEGIN
+        INSERT INTO leads_fts(leads_fts, rowid, {FTS_COLS}) VALUES ('delete', old.id, {old_cols});
+        INSERT INTO leads_fts(rowid, {FTS_COLS}) VALUES (new.id, {new_cols}); END""")
+    cursor.execute("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')")
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name='leads_fts'").fetchone() is not None
+
+def fts_query(text):
+    """ User text -> safe FTS5 MATCH expression: every word quoted and prefix-matched, all required. """
+    return " ".join('"' + w.replace('"', '') + '"*' for w in text.split() if w.replace('"', ''))
+
+# ==============================================================================
+# GLOBAL DEDUPE INDEX (BLOOM FILTER PRELOADED FROM leads.dedupe_key)
+# A miss is certain (O(1), no query); a hit is confirmed with one indexed lookup.
+# ==============================================================================
+class BloomFilter:
+    def __init__(self, capacity, fp_rate=0.01):
+        self.bits = max(1024, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array, self.capacity, self.count = bytearray(self.bits // 8 + 1), capacity, 0
+
+    def _positions(self, key):
+        d = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key):
+        for p in self._positions(key): self.array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+class DedupeIndex:
+    """ Per-worker view of every dedupe_key in leads. refresh() loads rows added since the last call. """
+    def __init__(self):
+        self.bloom, self.last_id, self.lock = None, 0, threading.Lock()
+
+    def refresh(self, conn):
+        with self.lock:
+            top = conn.execute("SELECT MAX(id) FROM leads").fetchone()[0] or 0  # O(1) upper bound of the row count
+            if self.bloom is None or top > self.bloom.capacity:
+                self.bloom, self.last_id = BloomFilter(max(2 * top, 100_000)), 0
+            cur = conn.execute("SELECT id, dedupe_key FROM leads WHERE id > ? ORDER BY id", (self.last_id,))
+            while rows := cur.fetchmany(50_000):
+                for _, key in rows:
+                    if key: self.bloom.add(key)
+                self.last_id = rows[-1][0]
+
+    def seen(self, conn, name, phone):
+        key = dedupe_key(name, phone)
+        if self.bloom is not None and key not in self.bloom: return False
+        return conn.execute("SELECT 1 FROM leads WHERE dedupe_key=? LIMIT 1", (key,)).fetchone() is not None
+
+    def add(self, name, phone):
+        if self.bloom is not None: self.bloom.add(dedupe_key(name, phone))
+
+
+# ==============================================================================
+# BATCHED LEAD WRITER (ONE LONG-LIVED WAL CONNECTION PER WORKER PROCESS)
+# Leads, checkpoints, enrichment results, cache entries and metrics are queued
+# and committed together, BATCH_SIZE ops or BATCH_WAIT seconds at a time;
+# credits, task counters, cache hit counters and metrics are folded into one
+# write per key per batch. flush() is the durability barrier used before a task is released
+# (Stop/Pause/finish): only busy/locked batches are retried, any other failure is
+# raised by the next flush() so the task is requeued instead of finished.
+# ==============================================================================
+BATCH_SIZE = 200
+BATCH_WAIT = 0.5
+FLUSH_TIMEOUT = 120   # seconds flush() waits for the writer before giving up
+
+def is_busy(e):
+    """ True for the transient lock errors worth retrying (SQLITE_BUSY / SQLITE_LOCKED). """
+    name = getattr(e, "sqlite_errorname", "") or ""
+    return name.startswith(("SQLITE_BUSY", "SQLITE_LOCKED")) or "locked" in str(e) or "busy" in str(e)
+
+SQL_INSERT_LEAD = """INSERT INTO leads (session_id, keyword, city, country, name, phone, website, email, whatsapp, rating, social_media, dedupe_key)
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? WHERE NOT (? AND EXISTS (SELECT 1 FROM leads WHERE dedupe_key=?))"""
+SQL_CACHE_STATS = """INSERT INTO cache_stats (job_id, kind, hits, misses) VALUES (?, ?, ?, ?)
+    ON CONFLICT (job_id, kind) DO UPDATE SET hits=hits+excluded.hits, misses=misses+excluded.misses"""
+SQL_METRICS = """INSERT INTO metrics (session_id, task_id, stage, minute, calls, seconds, misses, errors) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (task_id, stage, minute) DO UPDATE SET calls=calls+excluded.calls, seconds=seconds+excluded.seconds,
+    misses=misses+excluded.misses, errors=errors+excluded.errors"""
+SQL_ENRICH = """UPDATE leads SET social_media = CASE WHEN social_media IS NULL OR social_media='N/A' THEN ? ELSE social_media END,
+    email = CASE WHEN ?='N/A' THEN email ELSE ? END WHERE id=?"""
+
+class LeadWriter:
+    def __init__(self, db=DB_NAME):
+        self.db, self.q, self.failed = db, queue.Queue(), None
+        self.thread = threading.Thread(target=self._run, daemon=True); self.thread.start()
+
+    def place(self, job, task_id, key, lead, on_saved=None):
+        """ Queues a visited place: its checkpoint, plus the lead (None = filtered out). on_saved(lead_id) runs after commit. """
+        self.q.put(("place", job, task_id, key, lead, on_saved))
+
+    def enrichment(self, lead_id, social, email):
+        """ Queues a website crawl result; a social link found on Maps itself wins over the crawled one. """
+        self.q.put(("enrich", lead_id, social, email))
+
+    def cache_put(self, table, key, data):
+        """ Queues a result cache entry (see cache.py). """
+        self.q.put(("cache", table, key, data))
+
+    def cache_hit(self, job_id, kind, hit):
+        """ Counts one cache lookup of a job. """
+        self.q.put(("hit", job_id, kind, hit))
+
+    def metrics(self, rows):
+        """ Queues metrics rows (session_id, task_id, stage, minute, calls, seconds, misses, errors), see metrics.py. """
+        self.q.put(("metrics", rows))
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """ Blocks until everything queued so far is committed. Raises RuntimeError when a batch since the last flush
+        failed (its places were not saved) and TimeoutError when the writer is stuck. """
+        done = threading.Event(); done.error = None
+        self.q.put(("flush", done))
+        if not done.wait(timeout): raise TimeoutError(f"LeadWriter flush timed out after {timeout}s")
+        if done.error: raise RuntimeError(f"LeadWriter batch failed: {done.error}") from done.error
+
+    def close(self):
+        try: self.flush()
+        finally: self.q.put(None); self.thread.join(FLUSH_TIMEOUT)
+
+    def _run(self):
+        conn = connect(self.db)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            ops = [self.q.get()]
+            end = time.monotonic() + BATCH_WAIT
+            while ops[-1] and ops[-1][0] != "flush" and len(ops) < BATCH_SIZE:
+                try: ops.append(self.q.get(timeout=max(0, end - time.monotonic())))
+                except queue.Empty: break
+            stop = ops[-1] is None
+            try: self._commit(conn, [op for op in ops if op and op[0] != "flush"])
+            except Exception as e:
+                # Not a lock: retrying won't help. The batch is dropped and reported to the next flush() caller
+                try: conn.rollback()
+                except Exception: pass
+                print(f"LeadWriter batch failed: {e}", file=sys.stderr); self.failed = e
+            for op in ops:
+                if op and op[0] == "flush": op[1].error, self.failed = self.failed, None; op[1].set()
+            if stop: return conn.close()
+
+    def _commit(self, conn, ops):
+        if not ops: return
+        while True:
+            try:
+                saved, credits, processed, lookups, stats, now = [], Counter(), Counter(), Counter(), {}, int(time.time() // 60)
+                def stat(sid, task_id, stage, m, calls, seconds=0.0, misses=0, errors=0):
+                    c = stats.setdefault((task_id, stage, m), [sid, 0, 0.0, 0, 0])
+                    c[1] += calls; c[2] += seconds; c[3] += misses; c[4] += errors
+                for op in ops:
+                    if op[0] == "enrich":
+                        _, lead_id, social, email = op
+                        conn.execute(SQL_ENRICH, (social, email, email, lead_id)); continue
+                    if op[0] == "cache":
+                        _, table, key, data = op
+                        conn.execute(f"INSERT OR REPLACE INTO {table} (key, data, fetched) VALUES (?, ?, ?)", (key, data, time.time())); continue
+                    if op[0] == "hit":
+                        _, job_id, kind, hit = op
+                        lookups[(job_id, kind, hit)] += 1; continue
+                    if op[0] == "metrics":
+                        for row in op[1]: stat(*row)
+                        continue
+                    _, job, task_id, key, lead, on_saved = op
+                    t = time.perf_counter()
+                    if lead:
+                        key_d = dedupe_key(lead["name"], lead["phone"])
+                        # Final dedupe guard inside the insert: catches keys another worker saved since our last refresh
+                        cur = conn.execute(SQL_INSERT_LEAD, (job["session_id"], lead["keyword"], lead["city"], job["country"], lead["name"], lead["phone"],
+                            lead["website"], lead["email"], lead["whatsapp"], lead["rating"], lead["social_media"], key_d, job["options"]["global_dedupe"], key_d))
+                        if cur.rowcount:
+                            processed[task_id] += 1; stat(job["session_id"], task_id, "lead", now, 1)
+                            if job["username"] != 'admin': credits[job["username"]] += 1
+                            if on_saved: saved.append((on_saved, cur.lastrowid))
+                    conn.execute("INSERT OR IGNORE INTO checkpoints (task_id, place) VALUES (?, ?)", (task_id, key))
+                    stat(job["session_id"], task_id, "insert", now, 1, time.perf_counter() - t)
+                conn.executemany("UPDATE user_credits SET balance=balance-? WHERE username=?", [(n, u) for u, n in credits.items()])
+                conn.executemany("UPDATE tasks SET processed=processed+? WHERE id=?", [(n, t) for t, n in processed.items()])
+                conn.executemany(SQL_CACHE_STATS, [(j, k, n if hit else 0, 0 if hit else n) for (j, k, hit), n in lookups.items()])
+                conn.executemany(SQL_METRICS, [(c[0], task_id, stage, m, *c[1:]) for (task_id, stage, m), c in stats.items()])
+                conn.commit(); break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e): raise
+                # Locked/busy beyond the connection timeout: nothing was committed, retry the whole batch
+                conn.rollback(); print(f"LeadWriter retry: {e}", file=sys.stderr); time.sleep(1)
+        for cb, lead_id in saved:
+            try: cb(lead_id)
+            except Exception: pass
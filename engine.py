@@ -0,0 +1,484 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+import functools
+from urllib.parse import quote
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from webdriver_manager.chrome import ChromeDriverManager
+
+# ==============================================================================
+# ENGINE & ROBUST LOGIC (ROOT FIX FOR REVIEWS & WHATSAPP)
+# Runs inside the job workers (jobs.py), never inside the Streamlit script.
+# Two backends share one interface (MapsEngine): SeleniumEngine (one Chrome per
+# worker, fallback) and PlaywrightEngine (asyncio, many pages in one browser).
+# ==============================================================================
+SOCIAL_HOSTS = ["facebook.com", "instagram.com", "linkedin.com", "twitter.com"]
+SOCIAL_PATTERNS = [r'instagram\.com/[a-zA-Z0-9_.]+', r'facebook\.com/[a-zA-Z0-9_.]+', r'linkedin\.com/company/[a-zA-Z0-9_-]+']
+EMAIL_PATTERN = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+
+MAPS_URL = os.environ.get("CHATSCRAP_MAPS_URL", "https://www.google.com/maps")  # bench.py points this at its fixture server
+
+SEL_FEED = 'div[role="feed"]'
+SEL_PLACE = 'a[href*="/maps/place/"]'
+SEL_NAME = "h1.DUwDvf"
+SEL_PHONE = '[data-item-id*="phone:tel"]'
+SEL_STARS = 'span[aria-label*="stars"]'
+SEL_REVIEWS = 'span[aria-label*="reviews"]'
+SEL_WEBSITE = 'a[data-item-id="authority"]'
+SEL_FEED_END = "span.HlvSq"  # "You've reached the end of the list."
+
+# ADAPTIVE WAITS: upper bounds only, every wait returns as soon as the DOM is ready
+SEARCH_WAIT = 15   # feed (or single-place panel) rendered
+SCROLL_WAIT = 3    # feed grew after a scroll; no growth within this = feed exhausted
+PLACE_WAIT = 8     # detail panel switched to the clicked place
+SITE_IDLE = 2      # extra network-idle grace for JS-built websites (Playwright)
+POLL = 0.1
+
+# ⚡ LIGHT PROFILE: eager page loads, no images/media/fonts/trackers, warm drivers recycled every RECYCLE_AFTER pages
+RECYCLE_AFTER = int(os.environ.get("CHATSCRAP_RECYCLE_AFTER", 150))
+DRIVER_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "chatscrap", "chromedriver.path")
+TRACKER_HOSTS = ["googletagmanager.com", "google-analytics.com", "doubleclick.net", "googlesyndication.com", "googleadservices.com",
+                 "connect.facebook.net", "hotjar.com", "clarity.ms", "analytics.tiktok.com", "snap.licdn.com"]
+# CDP patterns only know '*': anchor them so e.g. "gif" can't match gifts-shop.ma or "clarity.ms" another host's path
+BLOCKED_URLS = [p for ext in ["png", "jpg", "jpeg", "gif", "webp", "avif", "ico", "woff", "woff2", "ttf", "otf", "mp4", "webm", "mp3", "m4a"]
+                for p in (f"*.{ext}", f"*.{ext}?*")] \
+    + [p for host in TRACKER_HOSTS for p in (f"*://{host}/*", f"*://*.{host}/*")]
+LIGHT_ARGS = ["--blink-settings=imagesEnabled=false", "--disable-extensions", "--mute-audio", "--disable-background-networking",
+              "--disable-component-update", "--disable-default-apps", "--no-first-run"]
+
+# DOM readiness predicates, shared by Selenium (execute_script) and Playwright (wait_for_function)
+FEED_GREW_FN = "(sel, n, end) => document.querySelectorAll(sel).length > n || !!document.querySelector(end)"
+# A panel is only ready once the URL carries the clicked place id AND the h1 shows the clicked card's name:
+# Maps may update the URL before it swaps the panel. Without a card name, a changed h1 has to do.
+PLACE_SHOWN_FN = """(sel, prev, key, name) => { const norm = (t) => (t || '').replace(/\\s+/g, ' ').trim(), h = document.querySelector(sel);
+    const t = h && h.textContent, url = !/^0x/.test(key) || decodeURIComponent(location.href).includes(key);
+    return t && url && (name ? norm(t) === norm(name) : t !== prev) ? t : null; }"""
+
+# ⚡ CLICK-FREE CARDS: everything a result card shows, read for the whole feed in one script call
+CARD_FN = """(e) => {
+    const c = e.closest('div.Nv2PK') || e.parentElement || e, q = (s) => c.querySelector(s);
+    const stars = q('span[role="img"][aria-label*="tar"]'), label = stars ? stars.getAttribute('aria-label') : '';
+    const web = q('a[data-value="Website"]') || q('a.lcr4fd');
+    const phone = (q('span.UsdlK') || {}).textContent || ((c.innerText || '').match(/(\+?\d[\d\s().-]{7,}\d)/) || [])[1] || '';
+    return {name: e.getAttribute('aria-label') || '', phone: phone.trim(),
+            stars: (label.match(/^[\d.,]+ stars?/i) || [''])[0], reviews: ((label.match(/([\d,.]+)\s+reviews?/i) || [])[1] || ''),
+            website: web ? web.href : ''};
+}"""
+JS_NEW_PLACES = f"const card = {CARD_FN}; return Array.from(document.querySelectorAll(arguments[0])).slice(arguments[1]).map(e => [e, e.href, card(e)]);"
+CARDS_FN = f"([sel, n]) => {{ const card = {CARD_FN}; return Array.from(document.querySelectorAll(sel)).slice(n).map(e => [e.href, card(e)]); }}"
+CLICK_FN = """([sel, i, key]) => { const all = document.querySelectorAll(sel);
+    (all[i] && all[i].href.includes(key) ? all[i] : Array.from(all).find(e => e.href.includes(key))).click(); }"""
+
+def search_url(kw, city):
+    return f"{MAPS_URL}/search/{quote(kw)}+in+{quote(city)}?hl=en&gl=ma"
+
+def wait_until(fn, timeout, poll=POLL):
+    """ Polls fn until it returns something truthy (returned) or timeout elapses (None). Exceptions count as not ready. """
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            res = fn()
+            if res: return res
+        except Exception: pass
+        if time.monotonic() >= end: return None
+        time.sleep(poll)
+
+# ------------------------------------------------------------------------------
+# PURE HELPERS (shared by both backends)
+# ------------------------------------------------------------------------------
+def safe_math_rating(text):
+    """ Converts text like '4.1 stars' to float safely. Returns 5.0 for N/A. """
+    try:
+        if not text or text == "N/A": return 5.0
+        match = re.findall(r"(\d+\.\d+|\d+)", text)
+        return float(match[0]) if match else 5.0
+    except: return 5.0
+
+def place_key(href):
+    """ Stable id of a Maps place: the '!1s0x..:0x..' feature id, else the URL without its volatile query string. """
+    m = re.search(r"!1s(0x[0-9a-f]+:0x[0-9a-f]+)", href or "")
+    return m.group(1) if m else (href or "").split("?")[0]
+
+def whatsapp_link(phone):
+    """ 🔥 DIRECT WHATSAPP LINK FIX: Moroccan mobiles only (06/07, +2126/+2127). """
+    cp = re.sub(r'\D', '', phone)
+    if any(cp.startswith(x) for x in ['2126','2127','06','07']) and not (cp.startswith('2125') or cp.startswith('05')):
+        if cp.startswith('0'): cp = '212' + cp[1:]
+        return f'<a href="https://api.whatsapp.com/send?phone={cp}" target="_blank" class="wa-link"><i class="fab fa-whatsapp"></i> Chat Now</a>'
+    return "N/A"
+
+def parse_site(src, find_socials, find_email):
+    """ Runs the social/email regexes over a lowercased page source. Returns (social, email). """
+    social, em = "N/A", "N/A"
+    if find_socials:
+        for p in SOCIAL_PATTERNS:
+            m = re.findall(p, src)
+            if m: social = m[0]; break
+    if find_email:
+        em_m = re.findall(EMAIL_PATTERN, src)
+        em = list(set(em_m))[0] if em_m else "N/A"
+    return social, em
+
+def rating_text(stars_txt, rev_txt):
+    """ 🔥 ROOT FIX: FULL ARIA-LABEL RATING & REVIEWS. Returns (display text, numeric rating). """
+    if not stars_txt: return "N/A", 5.0
+    return (f"{stars_txt} ({rev_txt})" if rev_txt else stars_txt), safe_math_rating(stars_txt)
+
+def split_website(maps_web):
+    """ 🔥 ROOT FIX: SOCIAL CLASSIFIER (Moves Socials from Website to Social column). Returns (website, social). """
+    if any(x in str(maps_web).lower() for x in SOCIAL_HOSTS): return "N/A", maps_web
+    return maps_web, "N/A"
+
+def card_ready(card, opts):
+    """ True when the result card alone covers this job: name + phone, and the website when one is needed.
+    Cards list the rating whenever the place has one, so a missing rating never needs a click. """
+    if not opts.get("fast") or not card or not card.get("name") or not card.get("phone"): return False
+    return bool(card.get("website")) or not (opts["website"] or opts["social"] or opts["email"])
+
+def place_info(name, phone, stars, reviews, website):
+    """ Details of a clicked place in the card's shape ('' for missing parts); this is what the place cache stores. """
+    return {"name": name, "phone": phone, "stars": stars or "", "reviews": reviews or "",
+            "website": "" if website == "N/A" else website or "", "clicked": True}
+
+def build_lead(info, opts, kw, city, is_dupe):
+    """ Runs the job filters over a place's details. Returns (lead, website to crawl or None), or (None, None) when filtered out. """
+    name, phone = info["name"], info["phone"]
+    if opts["phone_only"] and (phone == "N/A" or not phone): return None, None
+
+    # 🔥 GLOBAL DEDUPE PRO
+    if opts["global_dedupe"] and is_dupe(name, phone): return None, None
+
+    full_review, r_numeric = rating_text(info["stars"], info["reviews"])
+    # 🔥 ROOT FIX: ANTI-FREEZE FILTER (No Freeze)
+    if opts["negative"] and r_numeric >= 3.5: return None, None
+
+    final_web, social_found = split_website(info["website"] or "N/A")
+    # Deep site crawl happens off the hot path (enrich.py); the sink queues it once the lead is saved
+    site = final_web if final_web != "N/A" and (opts["social"] or opts["email"]) else None
+    return make_lead(kw, city, opts, name, phone, full_review, final_web, "N/A", social_found), site
+
+def make_lead(kw, city, opts, name, phone, full_review, final_web, email, social_found):
+    return {"keyword": kw, "city": city, "name": name, "phone": phone, "whatsapp": whatsapp_link(phone),
+            "website": final_web if opts["website"] else "N/A", "email": email if opts["email"] else "N/A",
+            "rating": full_review, "social_media": social_found}
+
+# ------------------------------------------------------------------------------
+# ENGINE INTERFACE
+# ------------------------------------------------------------------------------
+class MapsEngine:
+    """ One browser tab able to scrape Maps. PlaywrightPage implements the same methods as coroutines;
+    sync engines reach ascrape_task through SyncEngine. """
+    def search(self, kw, city):
+        """ Loads the search results of kw in city, returning True once the feed is rendered (False on timeout). """
+        raise NotImplementedError
+    def harvest(self, depth):
+        """ Yields (place_key, handle, card) for each result as soon as it is loaded, scrolling the feed
+        (at most depth times) only when the consumer asks for more and stopping once it stops growing.
+        card holds what the result card shows: name, phone, stars, reviews, website ('' when absent). """
+        raise NotImplementedError
+    def open_place(self, key, handle, name=""):
+        """ Opens a result's detail panel, returning True once it shows that place: its id in the URL and name (the
+        card's) in the heading. False on timeout, when the panel may still show the previous place. """
+        raise NotImplementedError
+    def contact(self):
+        """ Returns (name, phone) of the open place; raises when the panel has no name. """
+        raise NotImplementedError
+    def rating(self):
+        """ Returns (stars aria-label, reviews text); None for missing parts. """
+        raise NotImplementedError
+    def website(self):
+        """ Returns the 'authority' link of the open place or 'N/A'. """
+        raise NotImplementedError
+    def details(self):
+        """ place_info() of the open place, read in one go so it can be cached whole. """
+        name, phone = self.contact()
+        return place_info(name, phone, *self.rating(), self.website())
+    def deep_site(self, url, find_socials, find_email):
+        """ Crawls a lead's website in the browser (fallback for JS-only sites, see enrich.py). Returns (social, email);
+        raises when the crawl fails. """
+        raise NotImplementedError
+    def healthy(self):
+        """ Warm-browser check between tasks: False once the browser died or served RECYCLE_AFTER pages (then it is replaced). """
+        return True
+    def close(self):
+        pass
+
+# ------------------------------------------------------------------------------
+# SELENIUM BACKEND (FALLBACK)
+# ------------------------------------------------------------------------------
+@functools.cache
+def driver_path():
+    """ Local chromedriver, resolved once per process: CHATSCRAP_CHROMEDRIVER, one on PATH, the one webdriver-manager
+    installed last time (DRIVER_CACHE), else a single webdriver-manager lookup that is then remembered.
+    None leaves it to Selenium Manager. """
+    path = os.environ.get("CHATSCRAP_CHROMEDRIVER") or shutil.which("chromedriver")
+    if path: return path
+    try:
+        with open(DRIVER_CACHE) as f: path = f.read().strip()
+        if os.path.exists(path): return path
+    except OSError: pass
+    try: path = ChromeDriverManager().install()
+    except Exception: return None
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE), exist_ok=True)
+        with open(DRIVER_CACHE, "w") as f: f.write(path)
+    except OSError: pass
+    return path
+
+def block_requests(driver):
+    """ CDP request blocking for the current tab (images/media/fonts/trackers); every new tab needs its own call. """
+    try: driver.execute_cdp_cmd("Network.enable", {}); driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except Exception: pass
+
+def get_driver():
+    opts = Options(); opts.add_argument("--headless=new"); opts.add_argument("--no-sandbox"); opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--window-size=1920,1080")
+    for arg in LIGHT_ARGS: opts.add_argument(arg)
+    opts.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    opts.page_load_strategy = "eager"  # get() returns at DOMContentLoaded; every Maps wait is an explicit wait_until
+    path = driver_path()
+    try: driver = webdriver.Chrome(service=Service(path), options=opts) if path else webdriver.Chrome(options=opts)
+    except: driver = webdriver.Chrome(options=opts)
+    block_requests(driver)
+    return driver
+
+def fetch_deep_site(driver, url, find_socials, find_email):
+    """ (social, email) of a website crawled in a new tab; raises when the crawl fails (the tab is closed first). """
+    if not url or url == "N/A": return "N/A", "N/A"
+    try:
+        driver.execute_script("window.open('');"); driver.switch_to.window(driver.window_handles[-1]); block_requests(driver)
+        driver.set_page_load_timeout(10); driver.get(url)
+        # Eager loads return before the page's scripts ran: give JS-built sites up to SITE_IDLE to finish loading
+        wait_until(lambda: driver.execute_script("return document.readyState") == "complete", SITE_IDLE)
+        return parse_site(driver.page_source.lower(), find_socials, find_email)
+    finally:
+        try:
+            if len(driver.window_handles) > 1: driver.close(); driver.switch_to.window(driver.window_handles[0])
+        except Exception: pass  # a dead driver: the original error (if any) is the one worth reporting
+
+class SeleniumEngine(MapsEngine):
+    def __init__(self, driver=None):
+        self.driver, self.pages = driver or get_driver(), 0
+
+    def healthy(self):
+        try: return self.pages < RECYCLE_AFTER and self.driver.execute_script("return 1") == 1
+        except Exception: return False
+
+    def search(self, kw, city):
+        driver, self.shown = self.driver, ""
+        self.pages += 1; driver.get(search_url(kw, city))
+        return bool(wait_until(lambda: driver.find_elements(By.CSS_SELECTOR, f"{SEL_FEED}, {SEL_NAME}"), SEARCH_WAIT))
+
+    def harvest(self, depth):
+        driver, count, scrolls = self.driver, 0, 0
+        while True:
+            fresh = driver.execute_script(JS_NEW_PLACES, SEL_PLACE, count)
+            if scrolls and not fresh: return  # end-of-list marker reached
+            count += len(fresh)
+            for el, href, card in fresh: yield place_key(href), el, card
+            if scrolls >= depth: return
+            try: pane = driver.find_element(By.CSS_SELECTOR, SEL_FEED)
+            except: return
+            driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", pane); scrolls += 1
+            if not wait_until(lambda: driver.execute_script(f"return ({FEED_GREW_FN})(...arguments);", SEL_PLACE, count, SEL_FEED_END), SCROLL_WAIT): return
+
+    def open_place(self, key, handle, name=""):
+        driver = self.driver
+        driver.execute_script("arguments[0].click();", handle)
+        shown = wait_until(lambda: driver.execute_script(f"return ({PLACE_SHOWN_FN})(...arguments);", SEL_NAME, self.shown, key, name), PLACE_WAIT)
+        self.shown = shown or self.shown
+        return shown is not None
+
+    def contact(self):
+        name = self.shown = self.driver.find_element(By.CSS_SELECTOR, SEL_NAME).text
+        phone = "N/A"
+        try: phone = self.driver.find_element(By.CSS_SELECTOR, SEL_PHONE).get_attribute("aria-label").replace("Phone: ", "")
+        except: pass
+        return name, phone
+
+    def rating(self):
+        stars_txt, rev_txt = None, None
+        try:
+            stars_txt = self.driver.find_element(By.CSS_SELECTOR, SEL_STARS).get_attribute("aria-label")
+            rev_el = self.driver.find_element(By.CSS_SELECTOR, SEL_REVIEWS)
+            rev_txt = rev_el.text if rev_el.text else rev_el.get_attribute("aria-label")
+        except: pass
+        return stars_txt, rev_txt
+
+    def website(self):
+        try: return self.driver.find_element(By.CSS_SELECTOR, SEL_WEBSITE).get_attribute("href")
+        except: return "N/A"
+
+    def deep_site(self, url, find_socials, find_email):
+        self.pages += 1
+        return fetch_deep_site(self.driver, url, find_socials, find_email)
+
+    def close(self):
+        self.driver.quit()
+
+class SyncEngine:
+    """ Presents a sync MapsEngine to ascrape_task. A Selenium worker drives a single tab, so its calls may block the loop. """
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __getattr__(self, name):
+        fn = getattr(self.engine, name)
+        async def call(*args): return fn(*args)
+        return call
+
+    async def harvest(self, depth):
+        for found in self.engine.harvest(depth): yield found
+
+async def _inline(fn, *args):
+    return fn(*args)
+
+def scrape_task(engine, job, task, sink):
+    """ Sync entry point of ascrape_task for SeleniumEngine; sink calls run inline on the worker thread. """
+    return asyncio.run(ascrape_task(SyncEngine(engine), job, task, sink, offload=_inline))
+
+# ------------------------------------------------------------------------------
+# PLAYWRIGHT BACKEND (ASYNCIO, MANY PAGES PER BROWSER PROCESS)
+# ------------------------------------------------------------------------------
+class PlaywrightEngine:
+    """ One Chromium process; every concurrent task gets its own context/page via new_page(). """
+    def __init__(self):
+        self.pw, self.browser = None, None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+        self.pw = await async_playwright().start()
+        self.browser = await self.pw.chromium.launch(headless=True, args=["--no-sandbox", "--disable-dev-shm-usage", *LIGHT_ARGS])
+        return self
+
+    async def new_page(self):
+        ctx = await self.browser.new_context(viewport={"width": 1920, "height": 1080}, locale="en-US")
+        page = await ctx.new_page(); await ablock_requests(ctx, page)
+        return PlaywrightPage(ctx, page)
+
+    async def close(self):
+        if self.browser: await self.browser.close()
+        if self.pw: await self.pw.stop()
+
+async def ablock_requests(ctx, page):
+    """ block_requests for a Playwright page. CDP blocking (unlike ctx.route) keeps the HTTP cache, so a warm page
+    doesn't re-download Maps' bundles on every search, and costs no Python round trip per request. """
+    try:
+        cdp = await ctx.new_cdp_session(page)
+        await cdp.send("Network.enable"); await cdp.send("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except Exception: pass
+
+class PlaywrightPage(MapsEngine):
+    """ MapsEngine over one Playwright page; every method except healthy() is a coroutine. """
+    def __init__(self, ctx, page):
+        self.ctx, self.page, self.pages = ctx, page, 0
+
+    def healthy(self):
+        return self.pages < RECYCLE_AFTER and not self.page.is_closed() and (self.ctx.browser is None or self.ctx.browser.is_connected())
+
+    async def _attr(self, selector, attr):
+        el = await self.page.query_selector(selector)
+        return await el.get_attribute(attr) if el else None
+
+    async def search(self, kw, city):
+        self.shown = ""; self.pages += 1
+        await self.page.goto(search_url(kw, city), wait_until="domcontentloaded")
+        try: await self.page.wait_for_selector(f"{SEL_FEED}, {SEL_NAME}", timeout=SEARCH_WAIT * 1000); return True
+        except: return False
+
+    async def harvest(self, depth):
+        page, count, scrolls = self.page, 0, 0
+        while True:
+            # One round trip per feed read; a result's handle is its index (CLICK_FN falls back to its key if links moved)
+            fresh = await page.evaluate(CARDS_FN, [SEL_PLACE, count])
+            if scrolls and not fresh: return  # end-of-list marker reached
+            for i, (href, card) in enumerate(fresh, count): yield place_key(href), i, card
+            count += len(fresh)
+            if scrolls >= depth: return
+            try:
+                await page.eval_on_selector(SEL_FEED, "e => e.scrollTop = e.scrollHeight"); scrolls += 1
+                await page.wait_for_function(f"([a, b, c]) => ({FEED_GREW_FN})(a, b, c)", arg=[SEL_PLACE, count, SEL_FEED_END], timeout=SCROLL_WAIT * 1000)
+            except: return
+
+    async def open_place(self, key, handle, name=""):
+        await self.page.evaluate(CLICK_FN, [SEL_PLACE, handle, key])
+        try: self.shown = await (await self.page.wait_for_function(f"([a, b, c, d]) => ({PLACE_SHOWN_FN})(a, b, c, d)", arg=[SEL_NAME, self.shown, key, name], timeout=PLACE_WAIT * 1000)).json_value(); return True
+        except: return False
+
+    async def contact(self):
+        name = self.shown = await self.page.text_content(SEL_NAME, timeout=1000)
+        phone = await self._attr(SEL_PHONE, "aria-label")
+        return name, (phone.replace("Phone: ", "") if phone else "N/A")
+
+    async def rating(self):
+        stars_txt = await self._attr(SEL_STARS, "aria-label")
+        rev_el = await self.page.query_selector(SEL_REVIEWS) if stars_txt else None
+        rev_txt = ((await rev_el.inner_text()) or await rev_el.get_attribute("aria-label")) if rev_el else None
+        return stars_txt, rev_txt
+
+    async def website(self):
+        return await self._attr(SEL_WEBSITE, "href") or "N/A"
+
+    async def details(self):
+        name, phone = await self.contact()
+        return place_info(name, phone, *await self.rating(), await self.website())
+
+    async def deep_site(self, url, find_socials, find_email):
+        if not url or url == "N/A": return "N/A", "N/A"
+        page = await self.ctx.new_page(); self.pages += 1
+        await ablock_requests(self.ctx, page)
+        try:
+            await page.goto(url, timeout=10000, wait_until="domcontentloaded")
+            try: await page.wait_for_load_state("networkidle", timeout=SITE_IDLE * 1000)
+            except: pass
+            return parse_site((await page.content()).lower(), find_socials, find_email)
+        finally: await page.close()
+
+    async def close(self):
+        await self.ctx.close()
+
+async def ascrape_task(engine, job, task, sink, offload=asyncio.to_thread):
+    """ Scrapes one (city, keyword) task; the single place loop of both backends (engine is a PlaywrightPage or a
+    SyncEngine). Every visited place is reported through sink.place(key, lead, site) — lead is None when the place
+    was filtered out — so the caller can checkpoint it and queue the website crawl; places already in sink.done are
+    skipped. sink.cached_place(key) / sink.cache_place(key, info) let places seen by earlier searches skip the click,
+    and every stage is timed on sink.metrics (see metrics.py). Sink calls hit SQLite, so they go through offload
+    (a worker thread by default). Returns True when the task ran to its end. """
+    opts, limit_in, kw, city, m = job["options"], job["lim"], task["keyword"], task["city"], sink.metrics
+    processed = task["processed"]
+    with m.timed("search"):
+        if not await engine.search(kw, city): m.miss("search")
+    # Streaming: each result is extracted as soon as the feed yields it; the feed only scrolls for more when needed
+    async for key, item, card in m.atimed_iter(engine.harvest(job["depth"]), "scroll"):
+        if processed >= limit_in: return True  # resumed task whose checkpoints already cover the limit
+        if await offload(sink.should_stop): return False
+        if key in sink.done: continue
+        sink.done.add(key); m.add("place")
+        try:
+            # 🗃️ Place cache first, then ⚡ Fast Cards: a place is only clicked when neither covers what this job needs
+            info = await offload(sink.cached_place, key)
+            if info is None:
+                if card_ready(card, opts): info = dict(card, clicked=False); sink.cache_place(key, info)
+                else:
+                    with m.timed("click"): opened = await engine.open_place(key, item, card.get("name") or "")
+                    if not opened:
+                        # The panel still shows the previous place: nothing is saved or checkpointed, so a resume retries it
+                        m.miss("click"); continue
+                    with m.timed("extract"): info = await engine.details()
+                    if not info["name"] or info["phone"] == "N/A": m.miss("extract")
+                    # The panel lookups return nothing instead of raising: count each field that came back empty
+                    if not (info["stars"] and info["reviews"]): m.miss("extract.rating")
+                    if not info["website"]: m.miss("extract.website")
+                    # Reaching here means open_place() confirmed the panel shows this place: only then is it cached as complete
+                    if info["name"]: sink.cache_place(key, info)
+            lead, site = await offload(build_lead, info, opts, kw, city, sink.is_dupe)
+            await offload(sink.place, key, lead, site)
+            if lead:
+                processed += 1
+                if processed >= limit_in: return True  # don't scroll the feed for results the limit won't take
+        except Exception: m.error("place")
+    return True
@@ -0,0 +1,124 @@
+import re
+import time
+import queue
+import asyncio
+import threading
+from urllib.parse import urljoin, urlparse
+from engine import parse_site
+try: import aiohttp
+except ImportError: aiohttp = None
+
+# ==============================================================================
+# DEEP EMAIL / SOCIAL ENRICHMENT (ASYNC HTTP, OFF THE MAPS HOT PATH)
+# Leads are saved first; their websites are crawled here in parallel over one
+# pooled keep-alive HTTP session and the results are written back as they land.
+# Pages that only render with JavaScript (or block plain HTTP clients) are handed
+# back to the worker's browser through take_fallbacks().
+# ==============================================================================
+MAX_CONNS = 64          # sockets in the pool
+PER_DOMAIN = 2          # concurrent requests per website
+TIMEOUT = 8             # seconds per request
+MAX_BYTES = 1_000_000   # enough for any contact page, caps memory on huge pages
+CHUNK = 64 * 1024       # read size while streaming a page body
+EXTRA_PAGES = 2         # contact/about pages visited when the homepage lacks what we want
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+           "Accept-Language": "en-US,en;q=0.9,fr;q=0.8"}
+
+CONTACT_HINTS = re.compile(r"contact|about|a-propos|apropos|qui-sommes|impressum|kontakt|contacto|sobre", re.I)
+NEEDS_JS = object()
+
+def needs_js(html):
+    """ True for app shells: next to no visible text once scripts/styles/tags are stripped. """
+    text = re.sub(r"<script.*?</script>|<style.*?</style>|<[^>]+>", " ", html, flags=re.S | re.I)
+    return len(" ".join(text.split())) < 150 and "<script" in html.lower()
+
+def candidate_pages(url, html):
+    """ Same-site contact/about links found on the homepage, else the usual /contact and /about paths. """
+    host, found = urlparse(url).netloc, []
+    for href in re.findall(r'href=["\']([^"\'#]+)["\']', html):
+        link = urljoin(url, href)
+        if urlparse(link).netloc == host and CONTACT_HINTS.search(urlparse(link).path) and link not in found: found.append(link)
+    return (found or [urljoin(url, "/contact"), urljoin(url, "/about")])[:EXTRA_PAGES]
+
+class Enricher:
+    """ Background event loop crawling lead websites. on_result(ref, social, email, seconds) runs in the loop thread
+    (and in the worker thread for browser fallbacks); on_error(ref, seconds) reports a crawl that crashed. seconds is
+    the time spent crawling (HTTP plus browser), not the time the site waited in a queue. """
+    def __init__(self, on_result, on_error=None):
+        self.on_result, self.on_error, self.fallbacks = on_result, on_error, queue.Queue()
+        self.inflight, self.lock, self.idle = 0, threading.Lock(), threading.Event()
+        self.idle.set(); self.domains = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True); self.thread.start()
+        self.session = asyncio.run_coroutine_threadsafe(self._open(), self.loop).result()
+
+    async def _open(self):
+        if not aiohttp: return None
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MAX_CONNS, ttl_dns_cache=300, ssl=False),
+                                     timeout=aiohttp.ClientTimeout(total=TIMEOUT), headers=HEADERS)
+
+    def submit(self, ref, url, find_socials, find_email):
+        with self.lock: self.inflight += 1; self.idle.clear()
+        asyncio.run_coroutine_threadsafe(self._enrich(ref, url, find_socials, find_email), self.loop)
+
+    def take_fallbacks(self):
+        """ Crawls that need a real browser: [(ref, url, find_socials, find_email, seconds spent over HTTP)]. """
+        out = []
+        while True:
+            try: out.append(self.fallbacks.get_nowait())
+            except queue.Empty: return out
+
+    def drain(self, timeout=60):
+        """ Blocks until every submitted crawl has finished (or was handed to the browser). """
+        return self.idle.wait(timeout)
+
+    def close(self):
+        self.drain()
+        if self.session: asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop); self.thread.join(5)
+
+    async def _enrich(self, ref, url, find_socials, find_email):
+        t = time.monotonic()
+        try:
+            res = await self._crawl(url, find_socials, find_email)
+            if res is None: self.fallbacks.put((ref, url, find_socials, find_email, time.monotonic() - t))
+            else: self.on_result(ref, *res, time.monotonic() - t)
+        except Exception:
+            if self.on_error: self.on_error(ref, time.monotonic() - t)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+                if not self.inflight: self.idle.set()
+
+    async def _get(self, url):
+        """ Page html, None when unreachable/not html, NEEDS_JS when only a browser will do. """
+        domain = urlparse(url).netloc.lower().removeprefix("www.")
+        sem = self.domains.setdefault(domain, asyncio.Semaphore(PER_DOMAIN))
+        async with sem:
+            try:
+                async with self.session.get(url, allow_redirects=True) as resp:
+                    if resp.status in (403, 429, 503): return NEEDS_JS
+                    if resp.status >= 400 or "html" not in resp.headers.get("Content-Type", "html"): return None
+                    # content.read(n) only returns what is already buffered: read chunks until EOF or the cap
+                    body = bytearray()
+                    async for chunk in resp.content.iter_chunked(CHUNK):
+                        body += chunk
+                        if len(body) >= MAX_BYTES: break
+                    html = bytes(body[:MAX_BYTES]).decode(resp.charset or "utf-8", "ignore")
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, LookupError): return None
+        return NEEDS_JS if needs_js(html) else html
+
+    async def _crawl(self, url, find_socials, find_email):
+        """ (social, email) from the homepage plus likely contact pages, or None to fall back to the browser. """
+        if not self.session: return None
+        home = await self._get(url)
+        if home is NEEDS_JS: return None
+        if home is None: return "N/A", "N/A"
+        social, em = parse_site(home.lower(), find_socials, find_email)
+        if (social == "N/A" and find_socials) or (em == "N/A" and find_email):
+            for page in await asyncio.gather(*[self._get(u) for u in candidate_pages(url, home)]):
+                if not isinstance(page, str): continue
+                s2, e2 = parse_site(page.lower(), find_socials, find_email)
+                if social == "N/A": social = s2
+                if em == "N/A": em = e2
+        return social, em
@@ -0,0 +1,206 @@
+import os
+import sys
+import csv
+import gzip
+import json
+import time
+import argparse
+import subprocess
+import secrets
+import tempfile
+import itertools
+import importlib.util
+from db import connect, has_fts, fts_query
+
+# ==============================================================================
+# STREAMING EXPORTS (CSV / CSV.GZ / PARQUET / GOOGLE SHEETS)
+# Rows are pulled from SQLite CHUNK at a time and written straight out, so memory
+# stays flat whatever the export size. Any mix of sessions and/or a full-text
+# search can be exported. Files land in Streamlit's static folder under random
+# names and are downloaded from there (server.enableStaticServing), so an export
+# is never read back into the UI process; big exports are split into parts of
+# PART_ROWS rows to stay under Streamlit's static file size cap.
+# ==============================================================================
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_TTL = 3600   # export files are swept this many seconds after they were built
+CHUNK = 5000
+PART_ROWS = 100 * CHUNK   # rows per export file (~100 MB of CSV at most; Streamlit serves static files up to 200 MB)
+SHEET_BATCH = 1000
+PUSH_STALE = 120   # a running Sheets push without progress for this long is presumed dead (and can be resumed)
+LEAD_COLS = ["keyword", "city", "country", "name", "phone", "website", "email", "address", "whatsapp", "rating", "social_media"]
+FORMATS = {"CSV": ".csv", "CSV (gzip)": ".csv.gz", "Parquet": ".parquet"}
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+def lead_query(session_ids=None, session_like=None, search=None, columns=None, after_id=None):
+    """ Builds (sql, params, headers) over leads for the given sessions (ids and/or a sessions.query LIKE filter)
+    and/or search text, past lead id after_id. columns maps db column -> header (defaults to LEAD_COLS as-is). """
+    columns = columns or {c: c for c in LEAD_COLS}
+    where, params = [], []
+    if after_id: where.append("l.id > ?"); params.append(after_id)
+    if session_ids is not None:
+        ids = list(session_ids) or [-1]
+        where.append(f"l.session_id IN ({','.join('?' * len(ids))})"); params += ids
+    if session_like is not None:
+        where.append("l.session_id IN (SELECT id FROM sessions WHERE query LIKE ?)"); params.append(f"%{session_like}%")
+    if search and search.strip():
+        with connect() as conn: fts = has_fts(conn)
+        if fts: where.append("l.id IN (SELECT rowid FROM leads_fts WHERE leads_fts MATCH ?)"); params.append(fts_query(search))
+        else:
+            where.append("(l.name LIKE ? OR l.city LIKE ? OR l.keyword LIKE ? OR l.address LIKE ? OR l.email LIKE ?)"); params += [f"%{search.strip()}%"] * 5
+    sql = f"SELECT {', '.join('l.' + c for c in columns)} FROM leads l" + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY l.id"
+    return sql, params, list(columns.values())
+
+def stream(query, chunk=CHUNK):
+    """ Yields lists of at most chunk rows. """
+    sql, params, _ = query
+    conn = connect()
+    try:
+        cur = conn.execute(sql, params)
+        while rows := cur.fetchmany(chunk): yield rows
+    finally: conn.close()
+
+def _write_csv(path, headers, chunks, compress=False):
+    n = 0
+    with (gzip.open(path, "wt", newline="", encoding="utf-8") if compress else open(path, "w", newline="", encoding="utf-8")) as f:
+        w = csv.writer(f); w.writerow(headers)
+        for rows in chunks: w.writerows(rows); n += len(rows)
+    return n
+
+def _write_parquet(path, headers, chunks):
+    try: import pyarrow as pa, pyarrow.parquet as pq
+    except ImportError: raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema, n = pa.schema([(h, pa.string()) for h in headers]), 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as w:
+        for rows in chunks:
+            w.write_table(pa.Table.from_arrays([pa.array([None if v is None else str(v) for v in col], pa.string()) for col in zip(*rows)], schema=schema))
+            n += len(rows)
+    return n
+
+def to_csv(query, path, compress=False):
+    """ Writes the query to path (gzip when compress). Returns the row count. """
+    return _write_csv(path, query[2], stream(query), compress)
+
+def to_parquet(query, path):
+    """ Writes the query as one Parquet row group per chunk. Needs pyarrow. Returns the row count. """
+    return _write_parquet(path, query[2], stream(query))
+
+def sweep_exports(max_age=EXPORT_TTL):
+    """ Deletes export files older than max_age. """
+    try: names = os.listdir(EXPORT_DIR)
+    except OSError: return
+    for f in names:
+        path = os.path.join(EXPORT_DIR, f)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age: os.remove(path)
+        except OSError: pass
+
+def export_file(query, fmt, name="leads", part_rows=PART_ROWS):
+    """ Streams the query in one of FORMATS to EXPORT_DIR, a new file every part_rows rows. File names carry a random
+    token (they are served without auth). Returns ([path], rows); an empty query still gives one header-only file. """
+    os.makedirs(EXPORT_DIR, exist_ok=True); sweep_exports()
+    chunks, paths, n = stream(query, CHUNK), [], 0
+    while True:
+        first = next(chunks, None)
+        if first is None and paths: return paths, n
+        fd, path = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{secrets.token_urlsafe(12)}_", suffix=FORMATS[fmt])
+        os.close(fd)
+        part = itertools.chain([first] if first else [], itertools.islice(chunks, max(1, part_rows // CHUNK) - 1))
+        try: n += _write_parquet(path, query[2], part) if fmt == "Parquet" else _write_csv(path, query[2], part, compress=fmt == "CSV (gzip)")
+        except:
+            for p in paths + [path]: os.remove(p)
+            raise
+        paths.append(path)
+        if first is None: return paths, n
+
+def export_url(path):
+    """ Download URL of an export file (relative to the app page). """
+    return f"{EXPORT_URL}/{os.path.basename(path)}"
+
+# ------------------------------------------------------------------------------
+# GOOGLE SHEETS (gspread): batched append_rows, backing off on quota errors
+# ------------------------------------------------------------------------------
+def open_worksheet(service_account_file, sheet_url, tab="Leads"):
+    import gspread
+    sheet = gspread.service_account(filename=service_account_file).open_by_url(sheet_url)
+    try: return sheet.worksheet(tab)
+    except gspread.exceptions.WorksheetNotFound: return sheet.add_worksheet(title=tab, rows=1, cols=len(LEAD_COLS))
+
+def _append(ws, rows, retries=5):
+    for attempt in range(retries):
+        try: return ws.append_rows(rows, value_input_option="RAW")
+        except Exception as e:
+            if "429" not in str(e) or attempt == retries - 1: raise
+            time.sleep(2 ** attempt)
+
+def to_sheet(query, ws, batch=SHEET_BATCH, header=True, on_batch=None):
+    """ Appends the query to a gspread-compatible worksheet (anything with append_rows) in batches. Returns the row count.
+    With on_batch, the query's first column is a resume key (the lead id): it isn't sent, and on_batch(rows sent, last key)
+    runs after every append. """
+    n, skip = 0, 1 if on_batch else 0
+    if header: _append(ws, [query[2][skip:]])
+    for rows in stream(query, batch):
+        _append(ws, [["" if v is None else str(v) for v in r[skip:]] for r in rows]); n += len(rows)
+        if on_batch: on_batch(n, rows[-1][0])
+    return n
+
+# ------------------------------------------------------------------------------
+# BACKGROUND PUSHES: `python exports.py --push ID`, detached like the job workers,
+# so reruns, clicks and closed tabs never cut a push short; progress is saved after
+# every batch and a failed or stalled push resumes after its last pushed lead
+# ------------------------------------------------------------------------------
+def start_push(username, spec, service_account, sheet_url):
+    """ Queues a push of lead_query(**spec) to sheet_url and starts it. Returns the push id. """
+    with connect() as conn:
+        push_id = conn.execute("INSERT INTO sheet_pushes (username, spec, service_account, sheet_url, updated, created) VALUES (?, ?, ?, ?, ?, ?)",
+                               (username, json.dumps(spec), service_account, sheet_url, time.time(), time.strftime("%Y-%m-%d %H:%M"))).lastrowid
+        conn.commit()
+    _spawn_push(push_id)
+    return push_id
+
+def resume_push(push_id):
+    _spawn_push(push_id)
+
+def _spawn_push(push_id):
+    # The UI's working directory: DB_NAME is relative
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--push", str(push_id)], cwd=os.getcwd(),
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+def last_push(username):
+    """ Latest push of a user: {'id', 'status', 'rows', 'error', 'stalled'} or None. """
+    with connect() as conn:
+        row = conn.execute("SELECT id, status, rows, error, updated FROM sheet_pushes WHERE username=? ORDER BY id DESC LIMIT 1", (username,)).fetchone()
+    if not row: return None
+    return {"id": row[0], "status": row[1], "rows": row[2], "error": row[3],
+            "stalled": row[1] in ("queued", "running") and time.time() - (row[4] or 0) > PUSH_STALE}
+
+def push_sheet(push_id, ws=None):
+    """ Runs one push, header first, then the leads after its last pushed id in SHEET_BATCH batches.
+    ws replaces the gspread worksheet (tests). Returns False when another process is already running it. """
+    conn = connect()
+    def save(**cols):
+        cols["updated"] = time.time()
+        conn.execute(f"UPDATE sheet_pushes SET {', '.join(f'{c}=?' for c in cols)} WHERE id=?", (*cols.values(), push_id)); conn.commit()
+    try:
+        # Claim: a push whose runner is alive (fresh progress) is never run twice
+        cur = conn.execute("""UPDATE sheet_pushes SET status='running', error=NULL, updated=? WHERE id=?
+            AND (status IN ('queued', 'failed') OR (status='running' AND updated < ?))""", (time.time(), push_id, time.time() - PUSH_STALE))
+        conn.commit()
+        if not cur.rowcount: return False
+        spec, service_account, sheet_url, header, last_id, rows = conn.execute(
+            "SELECT spec, service_account, sheet_url, header, last_id, rows FROM sheet_pushes WHERE id=?", (push_id,)).fetchone()
+        try:
+            ws = ws or open_worksheet(service_account, sheet_url)
+            if not header: _append(ws, [LEAD_COLS]); save(header=1)
+            query = lead_query(**json.loads(spec), columns={"id": "id", **{c: c for c in LEAD_COLS}}, after_id=last_id)
+            to_sheet(query, ws, SHEET_BATCH, header=False, on_batch=lambda n, key: save(rows=rows + n, last_id=key))
+            save(status="done")
+        except Exception as e:
+            save(status="failed", error=str(e)[:500]); raise
+        return True
+    finally: conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ChatScrap Elite background Sheets push")
+    parser.add_argument("--push", type=int, required=True, help="sheet_pushes id to run or resume")
+    push_sheet(parser.parse_args().push)
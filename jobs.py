@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import importlib.util
+import subprocess
+import multiprocessing as mp
+import cache
+import metrics
+from db import connect, init_db, dedupe_key, DedupeIndex, LeadWriter
+
+# ==============================================================================
+# JOB ENGINE: SQLITE TASK QUEUE + MULTI-WORKER BROWSER POOL
+# The Streamlit UI only enqueues jobs and polls them; `python jobs.py` runs the
+# workers, each pulling (city, keyword) tasks. With the Playwright backend a
+# worker drives PAGES concurrent pages inside one Chromium; with Selenium
+# (fallback) a worker owns one headless Chrome.
+# ==============================================================================
+WORKERS = int(os.environ.get("CHATSCRAP_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BACKEND = os.environ.get("CHATSCRAP_BACKEND", "playwright" if importlib.util.find_spec("playwright") else "selenium")
+PAGES = int(os.environ.get("CHATSCRAP_PAGES", 6))
+STALE_AFTER = 120     # seconds without heartbeat before a running task is handed to another worker
+IDLE_EXIT = int(os.environ.get("CHATSCRAP_IDLE_EXIT", 300))  # idle workers quit (and free their Chrome); the UI respawns them on demand
+BEAT_EVERY = 2
+
+# ------------------------------------------------------------------------------
+# UI SIDE: enqueue / control / poll
+# ------------------------------------------------------------------------------
+def enqueue_job(username, kw_in, city_in, country, limit_in, depth_in, options):
+    """ Creates the archive session, the job and its (city, keyword) tasks. Returns (job_id, session_id). """
+    akws = [k.strip() for k in kw_in.split(',') if k.strip()]
+    acts = [c.strip() for c in city_in.split(',') if c.strip()]
+    with connect() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO sessions (query, date) VALUES (?, ?)", (f"{kw_in} | {city_in}", time.strftime("%Y-%m-%d %H:%M")))
+        sid = cur.lastrowid
+        cur.execute("INSERT INTO jobs (session_id, username, country, lim, depth, options, status, created) VALUES (?, ?, ?, ?, ?, ?, 'running', ?)",
+                    (sid, username, country, int(limit_in), int(depth_in), json.dumps(options), time.strftime("%Y-%m-%d %H:%M")))
+        job_id = cur.lastrowid
+        cur.executemany("INSERT INTO tasks (job_id, city, keyword) VALUES (?, ?, ?)", [(job_id, c, k) for c in acts for k in akws])
+        if not acts or not akws: cur.execute("UPDATE jobs SET status='done' WHERE id=?", (job_id,))
+        conn.commit()
+    return job_id, sid
+
+def set_job_status(job_id, status):
+    """ running / paused / stopped. Workers notice within one place and release their task. """
+    with connect() as conn:
+        conn.execute("UPDATE jobs SET status=? WHERE id=? AND status NOT IN ('done', 'stopped')", (status, job_id))
+        if status == 'stopped': conn.execute("UPDATE tasks SET status='cancelled' WHERE job_id=? AND status!='done'", (job_id,))
+        conn.commit()
+
+def job_progress(job_id):
+    """ Returns {'status', 'session_id', 'progress' (0-100), 'done', 'total', 'current', 'cache'} for the UI poller;
+    'cache' maps place/site to (hits, lookups). """
+    with connect() as conn:
+        job = conn.execute("SELECT status, session_id, lim FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if not job: return None
+        tasks = conn.execute("SELECT status, processed, city, keyword FROM tasks WHERE job_id=? ORDER BY id", (job_id,)).fetchall()
+        rates = cache.hit_rates(conn, job_id)
+    status, sid, lim = job
+    total = len(tasks) * lim or 1
+    got = sum(lim if t[0] == 'done' else min(t[1], lim) for t in tasks)
+    current = [f"`{t[3]}` in `{t[2]}`" for t in tasks if t[0] == 'running']
+    return {"status": status, "session_id": sid, "progress": min(int(got / total * 100), 100),
+            "done": sum(t[0] == 'done' for t in tasks), "total": len(tasks), "current": current, "cache": rates}
+
+def active_job(username):
+    """ Latest running/paused job of a user, so a browser refresh re-attaches to it. """
+    with connect() as conn:
+        return conn.execute("SELECT id, session_id FROM jobs WHERE username=? AND status IN ('running', 'paused') ORDER BY id DESC LIMIT 1", (username,)).fetchone()
+
+def ensure_workers(n=WORKERS, backend=BACKEND):
+    """ Starts a detached worker pool unless one is alive (fresh heartbeat) or was just spawned. The spawn is recorded as
+    a 'spawning' workers row first: a new pool imports its browser stack before its first beat, and reruns/pollers
+    calling in meanwhile must not start another one (the row simply goes stale after STALE_AFTER / 4). """
+    conn = connect()
+    try:
+        # Plain read first: UI polls only take the write lock when a pool actually has to be started
+        fresh = time.time() - STALE_AFTER / 4
+        if conn.execute("SELECT 1 FROM workers WHERE heartbeat > ? LIMIT 1", (fresh,)).fetchone(): return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            alive = conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat > ?", (fresh,)).fetchone()[0]
+            if not alive: conn.execute("INSERT OR REPLACE INTO workers (name, pid, heartbeat) VALUES ('spawning', ?, ?)", (os.getpid(), time.time()))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK"); raise
+    finally: conn.close()
+    if alive: return
+    # The pool runs in the UI's working directory: DB_NAME is relative, and both sides must open the same database
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--workers", str(n), "--backend", backend], cwd=os.getcwd(),
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+# ------------------------------------------------------------------------------
+# WORKER SIDE: claim / checkpoint / release
+# ------------------------------------------------------------------------------
+def claim_task(conn, worker):
+    """ Atomically moves the oldest queued task of a running job to 'running'. Returns (task, job) dicts or None. """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Requeue tasks whose worker died mid-way; their checkpoints make the retry skip finished places
+        conn.execute("UPDATE tasks SET status='queued' WHERE status='running' AND heartbeat < ?", (time.time() - STALE_AFTER,))
+        row = conn.execute("""SELECT t.id, t.city, t.keyword, t.processed, j.id, j.session_id, j.username, j.country, j.lim, j.depth, j.options
+            FROM tasks t JOIN jobs j ON j.id = t.job_id WHERE t.status='queued' AND j.status='running' ORDER BY t.id LIMIT 1""").fetchone()
+        if row: conn.execute("UPDATE tasks SET status='running', worker=?, heartbeat=? WHERE id=?", (worker, time.time(), row[0]))
+        conn.execute("COMMIT")
+    except:
+        conn.execute("ROLLBACK"); raise
+    if not row: return None
+    task = {"id": row[0], "city": row[1], "keyword": row[2], "processed": row[3]}
+    job = {"id": row[4], "session_id": row[5], "username": row[6], "country": row[7], "lim": row[8], "depth": row[9], "options": json.loads(row[10])}
+    return task, job
+
+def finish_task(conn, task_id, job_id, completed):
+    """ completed=True marks the task done (and the job once all its tasks are); otherwise it goes back to the queue. """
+    if completed:
+        conn.execute("UPDATE tasks SET status='done' WHERE id=? AND status='running'", (task_id,))
+        conn.execute("""UPDATE jobs SET status='done' WHERE id=? AND status='running'
+            AND NOT EXISTS (SELECT 1 FROM tasks WHERE job_id=? AND status!='done')""", (job_id, job_id))
+    else: conn.execute("UPDATE tasks SET status='queued' WHERE id=? AND status='running'", (task_id,))
+    conn.commit()
+
+def start_enricher(writer):
+    """ Sites are always crawled for both socials and email so the site cache entry serves any later job;
+    each lead only receives what its job asked for. Empty results aren't cached, so a site that was down gets another try.
+    ref = (lead_id, site, find_socials, find_email, session_id, task_id); seconds is the crawl itself (see enrich.Enricher).
+    A crashed crawl found nothing either: it counts as a miss and an error. """
+    import enrich
+    def crawl_metric(ref, seconds, miss=False, error=False):
+        writer.metrics([(ref[4], ref[5], "crawl", metrics.minute(), 1, seconds, int(miss), int(error))])
+    def on_result(ref, social, email, seconds):
+        lead_id, site, find_socials, find_email = ref[:4]
+        if social != "N/A" or email != "N/A": cache.SITES.put(writer, cache.site_key(site), {"social": social, "email": email})
+        writer.enrichment(lead_id, social if find_socials else "N/A", email if find_email else "N/A")
+        crawl_metric(ref, seconds, miss=social == "N/A" and email == "N/A")
+    return enrich.Enricher(on_result, on_error=lambda ref, seconds: crawl_metric(ref, seconds, miss=True, error=True))
+
+def browser_fallbacks(eng, enricher):
+    """ Crawls the JS-only websites the HTTP enricher handed back, with the worker's own browser tab. """
+    for ref, url, find_socials, find_email, spent in enricher.take_fallbacks():
+        t = time.monotonic()
+        try: social, email = eng.deep_site(url, find_socials, find_email)
+        except Exception: enricher.on_error(ref, spent + time.monotonic() - t); continue
+        enricher.on_result(ref, social, email, spent + time.monotonic() - t)
+
+class TaskSink:
+    """ Receives places from engine.ascrape_task and queues each lead together with its checkpoint on the worker's LeadWriter. """
+    def __init__(self, conn, job, task, writer, enricher=None, dedupe=None):
+        self.conn, self.job, self.task, self.writer, self.enricher, self.dedupe = conn, job, task, writer, enricher, dedupe
+        self.done = {r[0] for r in conn.execute("SELECT place FROM checkpoints WHERE task_id=?", (task["id"],))}
+        self.last_beat, self.stopped, self.metrics = 0, False, metrics.Metrics(job["session_id"], task["id"])
+        if dedupe and job["options"]["global_dedupe"]: dedupe.refresh(conn)
+
+    def should_stop(self):
+        """ Heartbeats the task and reports whether its job was paused/stopped (checked at most every BEAT_EVERY s). """
+        if time.time() - self.last_beat < BEAT_EVERY: return self.stopped
+        self.last_beat = time.time()
+        self.conn.execute("UPDATE tasks SET heartbeat=? WHERE id=?", (self.last_beat, self.task["id"])); self.conn.commit()
+        self.metrics.flush(self.writer)
+        status = self.conn.execute("SELECT status FROM jobs WHERE id=?", (self.job["id"],)).fetchone()[0]
+        self.stopped = status != 'running'
+        return self.stopped
+
+    def is_dupe(self, name, phone):
+        with self.metrics.timed("dedupe"):
+            if self.dedupe: return self.dedupe.seen(self.conn, name, phone)
+            return self.conn.execute("SELECT 1 FROM leads WHERE dedupe_key=? LIMIT 1", (dedupe_key(name, phone),)).fetchone() is not None
+
+    def cached_place(self, key):
+        """ 🗃️ Details of a place some earlier search already extracted, when they cover this job (else None). """
+        info = cache.PLACES.get(self.conn, key)
+        hit = cache.usable(info, self.job["options"])
+        self.writer.cache_hit(self.job["id"], "place", hit)
+        return info if hit else None
+
+    def cache_place(self, key, info):
+        cache.PLACES.put(self.writer, key, info)
+
+    def place(self, key, lead, site=None):
+        opts, on_saved = self.job["options"], None
+        if lead and self.dedupe: self.dedupe.add(lead["name"], lead["phone"])
+        if lead and site:
+            # 🗃️ Site cache: a domain crawled by an earlier job fills the lead right away, no crawl queued
+            found = cache.SITES.get(self.conn, cache.site_key(site))
+            self.writer.cache_hit(self.job["id"], "site", found is not None)
+            if found:
+                if opts["social"] and lead["social_media"] == "N/A": lead["social_media"] = found["social"]
+                if opts["email"]: lead["email"] = found["email"]
+            elif self.enricher:
+                ref = (site, opts["social"], opts["email"], self.job["session_id"], self.task["id"])
+                on_saved = lambda lead_id: self.enricher.submit((lead_id, *ref), site, True, True)
+        self.writer.place(self.job, self.task["id"], key, lead, on_saved)
+
+def beat(conn, name):
+    conn.execute("INSERT OR REPLACE INTO workers (name, pid, heartbeat) VALUES (?, ?, ?)", (name, os.getpid(), time.time())); conn.commit()
+
+def start_heartbeat(name):
+    """ Beats the workers row (and sweeps the caches) every BEAT_EVERY s from a thread of its own, so a worker stays
+    visibly alive through a long task. Returns stop(), which ends the thread before the row is deleted. """
+    halt = threading.Event()
+    def run():
+        conn = connect()
+        try:
+            while True:
+                try: beat(conn, name); cache.evict(conn)
+                except Exception: pass
+                if halt.wait(BEAT_EVERY): return
+        finally: conn.close()
+    thread = threading.Thread(target=run, daemon=True); thread.start()
+    def stop(): halt.set(); thread.join()
+    return stop
+
+def worker_loop(name):
+    """ Selenium worker: one warm Chrome (started before the first claim, recycled between tasks), one task at a time. """
+    import engine
+    conn, eng, idle_since, writer, dedupe = connect(), None, time.time(), LeadWriter(), DedupeIndex()
+    enricher, stop_beat = start_enricher(writer), start_heartbeat(name)
+    try:
+        while time.time() - idle_since < IDLE_EXIT:
+            if eng: browser_fallbacks(eng, enricher)
+            if eng and not eng.healthy():
+                # Recycle a dead or long-serving Chrome between tasks, capping its memory growth
+                try: eng.close()
+                except: pass
+                eng = None
+            if eng is None:
+                try: eng = engine.SeleniumEngine()
+                except Exception: time.sleep(5); continue
+            claimed = claim_task(conn, name)
+            if not claimed: time.sleep(1); continue
+            task, job = claimed
+            completed, sink = False, None
+            try:
+                sink = TaskSink(conn, job, task, writer, enricher, dedupe)
+                completed = engine.scrape_task(eng, job, task, sink)
+            except Exception:
+                # A crashed Chrome is replaced; the task is retried from its checkpoints
+                try: eng.close()
+                except: pass
+                eng = None; time.sleep(5)
+            finally:
+                if sink: sink.metrics.flush(writer, force=True)
+                # A failed or stuck write requeues the task: it resumes from its last committed checkpoint
+                try: writer.flush()
+                except Exception: completed = False
+                finish_task(conn, task["id"], job["id"], completed)
+            idle_since = time.time()
+    finally:
+        enricher.drain()
+        if eng: browser_fallbacks(eng, enricher); eng.close()
+        enricher.close()
+        try: writer.close()
+        except Exception: pass  # unsaved places are retried from their task's checkpoints
+        stop_beat()
+        conn.execute("DELETE FROM workers WHERE name=?", (name,)); conn.commit()
+
+async def _fallbacks(page, enricher):
+    for ref, url, find_socials, find_email, spent in enricher.take_fallbacks():
+        t = time.monotonic()
+        try: social, email = await page.deep_site(url, find_socials, find_email)
+        except Exception: enricher.on_error(ref, spent + time.monotonic() - t); continue
+        enricher.on_result(ref, social, email, spent + time.monotonic() - t)
+
+async def _page_loop(browser, name, state, writer, enricher, dedupe):
+    """ One concurrent Playwright page: claims and scrapes tasks until the whole worker has been idle for IDLE_EXIT.
+    The page (and its context) is opened before the first claim and recycled between tasks like the Selenium driver. """
+    import engine
+    conn, page = connect(), None
+    try:
+        while time.time() - state["idle_since"] < IDLE_EXIT:
+            if page: await _fallbacks(page, enricher)
+            if page and not page.healthy():
+                try: await page.close()
+                except: pass
+                page = None
+            if page is None:
+                try: page = await browser.new_page()
+                except Exception: await asyncio.sleep(5); continue
+            claimed = await asyncio.to_thread(claim_task, conn, name)
+            if not claimed: await asyncio.sleep(1); continue
+            task, job = claimed
+            completed, sink = False, None
+            try:
+                sink = await asyncio.to_thread(TaskSink, conn, job, task, writer, enricher, dedupe)
+                completed = await engine.ascrape_task(page, job, task, sink)
+            except Exception:
+                try: await page.close()
+                except: pass
+                page = None; await asyncio.sleep(5)
+            finally:
+                if sink: sink.metrics.flush(writer, force=True)
+                try: await asyncio.to_thread(writer.flush)
+                except Exception: completed = False
+                await asyncio.to_thread(finish_task, conn, task["id"], job["id"], completed)
+            state["idle_since"] = time.time()
+    finally:
+        if page:
+            await asyncio.to_thread(enricher.drain); await _fallbacks(page, enricher)
+            await page.close()
+
+async def _async_worker(name, pages):
+    import engine
+    try: browser = await engine.PlaywrightEngine().start()
+    except Exception: return False
+    conn, state, writer, dedupe = connect(), {"idle_since": time.time()}, LeadWriter(), DedupeIndex()
+    enricher = start_enricher(writer)
+    async def heartbeat():
+        while True:
+            await asyncio.to_thread(beat, conn, name); await asyncio.to_thread(cache.evict, conn)
+            await asyncio.sleep(BEAT_EVERY)
+    hb = asyncio.create_task(heartbeat())
+    try: await asyncio.gather(*[_page_loop(browser, f"{name}/{i}", state, writer, enricher, dedupe) for i in range(pages)])
+    finally:
+        hb.cancel(); await asyncio.to_thread(enricher.close)
+        try: await asyncio.to_thread(writer.close)
+        except Exception: pass
+        conn.execute("DELETE FROM workers WHERE name=?", (name,)); conn.commit()
+        await browser.close()
+    return True
+
+def async_worker(name, pages):
+    """ Playwright worker: one Chromium process, `pages` tasks in flight. Falls back to Selenium when Chromium won't launch. """
+    if not asyncio.run(_async_worker(name, pages)): worker_loop(name)
+
+def run_pool(n, backend=BACKEND, pages=PAGES):
+    init_db()
+    ctx = mp.get_context("spawn")
+    target, extra = (async_worker, (pages,)) if backend == "playwright" else (worker_loop, ())
+    procs = [ctx.Process(target=target, args=(f"{socket.gethostname()}-{os.getpid()}-{i}",) + extra) for i in range(n)]
+    for p in procs: p.start()
+    for p in procs: p.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ChatScrap Elite job workers")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--backend", choices=["playwright", "selenium"], default=BACKEND)
+    parser.add_argument("--pages", type=int, default=PAGES, help="concurrent pages per Playwright worker")
+    args = parser.parse_args()
+    run_pool(args.workers, args.backend, args.pages)
@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+
+# ==============================================================================
+# HOT-PATH METRICS (PER STAGE, PER TASK, PER MINUTE)
+# Workers time every stage of a place visit and count not-found results and
+# swallowed exceptions; counters are folded in memory and ride the LeadWriter
+# batches into the metrics table, which the 📈 Performance tab reads.
+#   search  results page load          misses: feed/panel never rendered
+#   scroll  reading + growing the feed
+#   click   opening a place panel      misses: panel did not switch in time
+#   extract reading the panel          misses: name or phone not found
+#     extract.rating / extract.website misses only: that panel field not found
+#   dedupe  global dedupe lookup
+#   insert  SQLite lead + checkpoint   (timed inside the LeadWriter)
+#   crawl   website email/social crawl misses: nothing found (crashes too); errors: crawl crashed
+#   place   one visited place          errors: place abandoned on an exception
+#   lead    one saved lead (throughput)
+# ==============================================================================
+STAGES = ["search", "scroll", "click", "extract", "dedupe", "insert", "crawl"]
+FLUSH_EVERY = 5   # seconds between metric flushes of a running task
+
+def minute():
+    return int(time.time() // 60)
+
+class Metrics:
+    """ Stage counters of one task: {(stage, minute): [calls, seconds, misses, errors]}. """
+    def __init__(self, session_id, task_id):
+        self.session_id, self.task_id, self.last_flush = session_id, task_id, time.monotonic()
+        self.counts = defaultdict(lambda: [0, 0.0, 0, 0])
+
+    def add(self, stage, seconds=0.0, miss=False, error=False, calls=1):
+        c = self.counts[(stage, minute())]
+        c[0] += calls; c[1] += seconds; c[2] += bool(miss); c[3] += bool(error)
+
+    def miss(self, stage):
+        self.add(stage, calls=0, miss=True)
+
+    def error(self, stage):
+        self.add(stage, calls=0, error=True)
+
+    @contextmanager
+    def timed(self, stage):
+        """ Times the block as one call of stage; an exception escaping it counts as an error (and is re-raised). """
+        t = time.perf_counter()
+        try: yield
+        except Exception:
+            self.add(stage, time.perf_counter() - t, error=True); raise
+        self.add(stage, time.perf_counter() - t)
+
+    async def atimed_iter(self, it, stage):
+        """ Re-yields an async generator, timing each step (e.g. harvest: feed reads + scrolls) as one call of stage. """
+        while True:
+            t = time.perf_counter()
+            try: item = await it.__anext__()
+            except StopAsyncIteration: return
+            self.add(stage, time.perf_counter() - t)
+            yield item
+
+    def rows(self):
+        """ Takes the folded counters as metrics rows. """
+        counts, self.counts, self.last_flush = self.counts, defaultdict(lambda: [0, 0.0, 0, 0]), time.monotonic()
+        return [(self.session_id, self.task_id, stage, m, *c) for (stage, m), c in counts.items()]
+
+    def flush(self, writer, force=False):
+        if self.counts and (force or time.monotonic() - self.last_flush >= FLUSH_EVERY): writer.metrics(self.rows())
+
+# ------------------------------------------------------------------------------
+# DASHBOARD QUERIES (📈 Performance tab)
+# ------------------------------------------------------------------------------
+def _where(session_ids):
+    ids = list(session_ids) or [-1]
+    return f"m.session_id IN ({','.join('?' * len(ids))})", ids
+
+def stage_breakdown(conn, session_ids):
+    """ [(stage, calls, seconds, misses, errors)] over the given sessions. """
+    where, params = _where(session_ids)
+    return conn.execute(f"""SELECT stage, SUM(calls), SUM(seconds), SUM(misses), SUM(errors) FROM metrics m
+        WHERE {where} GROUP BY stage""", params).fetchall()
+
+def throughput(conn, session_ids):
+    """ [(minute, leads saved)] over the given sessions. """
+    where, params = _where(session_ids)
+    return conn.execute(f"SELECT minute, SUM(calls) FROM metrics m WHERE {where} AND stage='lead' GROUP BY minute ORDER BY minute", params).fetchall()
+
+def failures(conn, session_ids):
+    """ Per (city, keyword): places visited/abandoned, leads saved and the not-found count of each stage. """
+    where, params = _where(session_ids)
+    return conn.execute(f"""SELECT t.city, t.keyword,
+        SUM(CASE WHEN m.stage='place' THEN m.calls END), SUM(CASE WHEN m.stage='place' THEN m.errors END),
+        SUM(CASE WHEN m.stage='lead' THEN m.calls END),
+        SUM(CASE WHEN m.stage='search' THEN m.misses END), SUM(CASE WHEN m.stage='click' THEN m.calls END), SUM(CASE WHEN m.stage='click' THEN m.misses END),
+        SUM(CASE WHEN m.stage='extract' THEN m.calls END), SUM(CASE WHEN m.stage='extract' THEN m.misses END),
+        SUM(CASE WHEN m.stage IN ('search', 'scroll', 'click', 'extract', 'dedupe', 'crawl') THEN m.errors END),
+        SUM(CASE WHEN m.stage='extract.rating' THEN m.misses END), SUM(CASE WHEN m.stage='extract.website' THEN m.misses END)
+        FROM metrics m JOIN tasks t ON t.id = m.task_id WHERE {where} GROUP BY t.city, t.keyword ORDER BY t.city, t.keyword""", params).fetchall()
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import exports
+from db import connect, init_db
+
+# ==============================================================================
+# GOOGLE SHEETS PUSH (exports.to_sheet / exports.push_sheet) AGAINST A LOCAL
+# STAND-IN WORKSHEET, IN A THROWAWAY DATABASE
+# ==============================================================================
+ROWS, BATCH = 25, 10
+
+class FakeWorksheet:
+    """ Records append_rows calls like a gspread Worksheet; the first quota_errors calls fail with a 429 (quota)
+    error and call number fail_at (1-based, counting failures) with a non-retryable one. """
+    def __init__(self, quota_errors=0, fail_at=None):
+        self.calls, self.quota_errors, self.fail_at, self.n = [], quota_errors, fail_at, 0
+
+    def append_rows(self, values, value_input_option=None):
+        self.n += 1
+        if self.quota_errors:
+            self.quota_errors -= 1; raise RuntimeError("APIError: [429]: Quota exceeded for quota metric 'Write requests'")
+        if self.n == self.fail_at: raise RuntimeError("APIError: [500]: Internal error")
+        self.calls.append(values)
+
+    @property
+    def rows(self):
+        return [r for c in self.calls for r in c]
+
+@pytest.fixture
+def sid(tmp_path, monkeypatch):
+    """ A fresh database (DB_NAME is relative) holding ROWS leads of one session; every other email is NULL. """
+    monkeypatch.chdir(tmp_path); init_db()
+    monkeypatch.setattr(exports.time, "sleep", lambda s: None)
+    monkeypatch.setattr(exports, "SHEET_BATCH", BATCH)
+    with connect() as conn:
+        sid = conn.execute("INSERT INTO sessions (query, date) VALUES ('cafe in Rabat', '')").lastrowid
+        conn.executemany("INSERT INTO leads (session_id, keyword, city, name, phone, email) VALUES (?, 'cafe', 'Rabat', ?, ?, ?)",
+                         [(sid, f"Business {i}", f"+212 6{i:08d}", None if i % 2 else f"b{i}@x.ma") for i in range(ROWS)])
+        conn.commit()
+    return sid
+
+def check_leads(rows):
+    name, email = exports.LEAD_COLS.index("name"), exports.LEAD_COLS.index("email")
+    assert len(rows) == ROWS and all(len(r) == len(exports.LEAD_COLS) for r in rows)
+    assert all(isinstance(v, str) for r in rows for v in r), "NULL cells must be sent as ''"
+    assert [(r[name], r[email]) for r in rows] == [(f"Business {i}", "" if i % 2 else f"b{i}@x.ma") for i in range(ROWS)]
+
+def test_to_sheet_batches(sid):
+    ws = FakeWorksheet(quota_errors=1)
+    assert exports.to_sheet(exports.lead_query([sid]), ws, batch=BATCH) == ROWS
+    assert ws.calls[0] == [exports.LEAD_COLS]
+    assert [len(c) for c in ws.calls[1:]] == [10, 10, 5]
+    check_leads(ws.rows[1:])
+
+def test_to_sheet_without_header(sid):
+    ws = FakeWorksheet()
+    exports.to_sheet(exports.lead_query([sid]), ws, batch=BATCH, header=False)
+    check_leads(ws.rows)
+
+def test_to_sheet_gives_up_on_other_errors(sid):
+    with pytest.raises(RuntimeError, match="500"):
+        exports.to_sheet(exports.lead_query([sid]), FakeWorksheet(fail_at=1), batch=BATCH)
+
+def test_push_resumes_after_failure(sid, monkeypatch):
+    monkeypatch.setattr(exports, "_spawn_push", lambda push_id: None)
+    push_id = exports.start_push("admin", {"session_ids": [sid]}, "sa.json", "https://sheet")
+    ws = FakeWorksheet(fail_at=3)   # header, first batch, then fails
+    with pytest.raises(RuntimeError):
+        exports.push_sheet(push_id, ws)
+    push = exports.last_push("admin")
+    assert (push["status"], push["rows"], push["stalled"]) == ("failed", BATCH, False) and "500" in push["error"]
+
+    assert exports.push_sheet(push_id, ws)
+    assert exports.last_push("admin")["status"] == "done"
+    assert ws.rows[0] == exports.LEAD_COLS and exports.LEAD_COLS not in ws.rows[1:]
+    check_leads(ws.rows[1:])
+    assert not exports.push_sheet(push_id, ws), "a finished push ran again"
+
+def test_push_claimed_once(sid, monkeypatch):
+    monkeypatch.setattr(exports, "_spawn_push", lambda push_id: None)
+    push_id = exports.start_push("admin", {"session_ids": [sid]}, "sa.json", "https://sheet")
+    with connect() as conn:
+        conn.execute("UPDATE sheet_pushes SET status='running' WHERE id=?", (push_id,)); conn.commit()
+    assert not exports.push_sheet(push_id, FakeWorksheet())
+    with connect() as conn:
+        conn.execute("UPDATE sheet_pushes SET updated=0 WHERE id=?", (push_id,)); conn.commit()
+    assert exports.last_push("admin")["stalled"]
+    assert exports.push_sheet(push_id, FakeWorksheet())